@@ -1,18 +1,76 @@
 import os
-import google.generativeai as genai
+import logging
+import threading
+import time
+import tracing
 from utils import handle_error, make_request
-from config import AI_CONFIG
+from html_reducer import estimate_tokens
+from model_router import ModelRouter, AllRoutesExhaustedError, mask_key
+from config import AI_CONFIG, ROUTING_CONFIG
+
+# google-generativeai release line per-key clients were checked against, see _bind_key
+GENAI_TESTED_VERSION = '0.8.'
+
+class QuotaExceededError(Exception):
+    """Raised when the Gemini API rejects a call for rate limit or quota reasons."""
+
+class StreamInterruptedError(Exception):
+    """Raised when a streamed response breaks off before it is complete."""
+
+def is_quota_error(error):
+    """True for 429 / ResourceExhausted errors from the Gemini API."""
+    from google.api_core import exceptions as google_exceptions
+    if isinstance(error, google_exceptions.ResourceExhausted):
+        return True
+    message = str(error).lower()
+    return '429' in message or 'quota' in message or 'rate limit' in message
+
+def _bind_key(model, api_key):
+    """Gives a GenerativeModel its own client for api_key and returns the model.
+
+    genai.configure() holds a single process-wide key, and the SDK has no public
+    way to give one model another key. So this builds the client the way
+    configure() builds the global one (same transport, user agent and default
+    metadata) and sets it on the model's private _client attribute. This is the
+    only place that touches SDK internals.
+    """
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
+    if not genai.__version__.startswith(GENAI_TESTED_VERSION):
+        logging.warning(f"Per-key Gemini clients were tested with google-generativeai {GENAI_TESTED_VERSION}x, "
+                        f"found {genai.__version__}")
+    if '_client' not in vars(model):
+        raise RuntimeError(f"google-generativeai {genai.__version__} no longer has GenerativeModel._client, "
+                           f"per-key routing needs updating")
+    configured = genai_client._client_manager
+    manager = genai_client._ClientManager()
+    manager.configure(api_key=api_key, transport=configured.client_config.get('transport'),
+                      default_metadata=configured.default_metadata)
+    model._client = manager.make_client('generative')
+    return model
 
 class APIHandler:
     def __init__(self):
         self.api_key = None
+        self.api_keys = []
+        self.router = None
         self.model = None
+        self.models = {}
+        # (key index, model name, stage) -> GenerativeModel bound to that key
+        self._route_models = {}
+        self._route_models_lock = threading.Lock()
         self.chat_session = None
         self.config = AI_CONFIG['html_analyzer']
-        self._configure_genai_proxy()
+        self.last_usage = None
+        self.usage_log = []
+        self._usage_lock = threading.Lock()
+        # The Gemini SDK takes most of a second to import, so it is loaded and
+        # set up when the first key is set rather than while the window opens
+        self._genai_configured = False
 
     def _configure_genai_proxy(self):
         """Configures proxy settings for the Gemini API client."""
+        import google.generativeai as genai
         try:
             # First try without proxy
             genai.configure(api_key="test_key")
@@ -26,56 +84,273 @@ class APIHandler:
             os.environ['HTTP_PROXY'] = proxies['http']
             os.environ['HTTPS_PROXY'] = proxies['https']
 
+    def stage_config(self, stage, tokens=0):
+        """Returns the model configuration a prompt of `tokens` tokens is routed to for a pipeline stage."""
+        if self.router is None:
+            return AI_CONFIG[stage]
+        tier = self.router.tiers(stage, tokens)[0]
+        return {'model': tier['model'], 'generation_config': self.router.generation_config(stage, tier)}
+
+    def key_count(self):
+        """Number of API keys requests are spread over."""
+        return len(self.api_keys)
+
+    def _create_models(self):
+        """Creates one model per stage so each stage uses its own generation_config."""
+        import google.generativeai as genai
+        self.models = {
+            stage: genai.GenerativeModel(
+                model_name=stage_config['model'],
+                generation_config=stage_config['generation_config']
+            )
+            for stage, stage_config in AI_CONFIG.items()
+        }
+        self.model = self.models['html_analyzer']
+
+    def _route_model(self, route):
+        """Returns the GenerativeModel for a route, with its own client bound to the route's key."""
+        import google.generativeai as genai
+        cache_key = (route.key_state.index, route.model, route.stage)
+        with self._route_models_lock:
+            model = self._route_models.get(cache_key)
+            if model is None:
+                model = _bind_key(genai.GenerativeModel(
+                    model_name=route.model,
+                    generation_config=route.generation_config
+                ), route.api_key)
+                self._route_models[cache_key] = model
+            return model
+
     def set_api_key(self, api_key):
-        """Sets the API key and configures the Gemini API."""
-        self.api_key = api_key
+        """Sets the API key(s) and configures the Gemini API.
+
+        Several keys may be given separated by commas; together with
+        ROUTING_CONFIG['api_keys'] they form the pool the router spreads calls over.
+        """
+        import google.generativeai as genai
+        if not self._genai_configured:
+            self._configure_genai_proxy()
+            self._genai_configured = True
+        keys = [key.strip() for key in api_key.split(',') if key.strip()]
+        self.api_keys = list(dict.fromkeys(keys + list(ROUTING_CONFIG['api_keys'])))
+        self.api_key = self.api_keys[0] if self.api_keys else api_key
         genai.configure(api_key=self.api_key)
+        self.router = ModelRouter(self.api_keys)
+        with self._route_models_lock:
+            self._route_models = {}
+        self.chat_session = None
         try:
-            self.model = genai.GenerativeModel(
-                model_name=self.config['model'],
-                generation_config=self.config['generation_config']
-            )
-            self.chat_session = self.model.start_chat(history=[])
+            self._create_models()
         except Exception as e:
             handle_error(f"Failed to initialize Gemini model: {e}")
             self.model = None
-            self.chat_session = None
+            self.models = {}
+
+    def is_ready(self):
+        """True once the API key is set and the models are initialized."""
+        return bool(self.models)
 
     def validate_api_key(self):
-        """Validates the API key by attempting to initialize the Gemini model."""
+        """Validates every configured API key with a single stateless request each.
+
+        Keys that fail are dropped from the pool. Returns True if at least one key works.
+        """
+        import google.generativeai as genai
         if not self.api_key:
             handle_error("API key not set.")
             return False
 
-        try:
-            # Try to initialize the model and create a chat session
-            if not self.model:
-                self.model = genai.GenerativeModel(
-                    model_name=self.config['model'],
-                    generation_config=self.config['generation_config']
-                )
-                self.chat_session = self.model.start_chat(history=[])
-            
-            # Try to send a test message
-            response = self.chat_session.send_message("test")
-            if response and response.text:
-                return True
-            else:
-                handle_error("API key validation failed: No response received")
-                return False
-        except Exception as e:
-            handle_error(f"An error occurred during API key validation: {e}")
+        valid_keys = []
+        for api_key in self.api_keys:
+            try:
+                model = _bind_key(genai.GenerativeModel(AI_CONFIG['html_analyzer']['model']), api_key)
+                # Try to send a test message; it is not kept in any history
+                response = model.generate_content("test")
+                if response and response.text:
+                    valid_keys.append(api_key)
+                else:
+                    handle_error(f"API key {mask_key(api_key)} validation failed: No response received")
+            except Exception as e:
+                handle_error(f"An error occurred during validation of API key {mask_key(api_key)}: {e}")
+
+        if not valid_keys:
             return False
+        if len(valid_keys) < len(self.api_keys):
+            logging.info(f"Using {len(valid_keys)} of {len(self.api_keys)} API keys")
+            self.set_api_key(",".join(valid_keys))
+        return True
+
+    def _record_usage(self, stage, response, label=None, route=None):
+        """Keeps the prompt/response token counts reported for one call."""
+        metadata = getattr(response, 'usage_metadata', None)
+        if metadata is None:
+            return
+        usage = {
+            'stage': stage,
+            'label': label,
+            'model': route.model if route else None,
+            'key': mask_key(route.api_key) if route else None,
+            'prompt_tokens': getattr(metadata, 'prompt_token_count', 0),
+            'response_tokens': getattr(metadata, 'candidates_token_count', 0),
+            'total_tokens': getattr(metadata, 'total_token_count', 0),
+        }
+        with self._usage_lock:
+            self.last_usage = usage
+            self.usage_log.append(usage)
+        tracing.current_span().set(prompt_tokens=usage['prompt_tokens'], response_tokens=usage['response_tokens'])
+        logging.info(f"{stage} call{f' for {label}' if label else ''} used {usage['prompt_tokens']} prompt tokens, "
+                     f"{usage['response_tokens']} response tokens")
+
+    def _acquire_route(self, stage, tokens, tried, deadline=None):
+        """Picks the next key/model for a call, raising QuotaExceededError once all are exhausted.
+
+        Waits for a benched route to cool down if it comes back before deadline.
+        """
+        try:
+            return self.router.acquire(stage, tokens, exclude=tried, deadline=deadline)
+        except AllRoutesExhaustedError as e:
+            raise QuotaExceededError(str(e)) from e
+
+    def _request_options(self, deadline):
+        """Request options for a call that has to finish by deadline.
+
+        Raises TimeoutError when the deadline passed while waiting for a route:
+        the caller has given up by then, so the request would only burn quota.
+        """
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Deadline passed while waiting for a free model route")
+        return {'timeout': remaining}
+
+    def _on_route_quota_error(self, route, tried, label, error):
+        self.router.mark_exhausted(route)
+        tried.add((route.key_state.index, route.model))
+        logging.warning(f"Quota exceeded on {route.model} with key {mask_key(route.api_key)}"
+                        f"{f' for {label}' if label else ''}, trying another route: {error}")
+
+    def generate(self, prompt, stage='html_analyzer', label=None, timeout=None):
+        """Sends a single stateless request carrying only this prompt and returns the response text.
+
+        The router picks the key and model tier. On a quota error the call moves
+        on to another key or tier. When timeout is given the underlying request
+        itself is aborted after that many seconds, counted from this call
+        (TimeoutError if waiting for a route already used them up).
+
+        Raises QuotaExceededError once every route is exhausted so callers can back off;
+        other errors are logged and return None.
+        """
+        if self.router is None or not self.models:
+            handle_error("Gemini model not initialized. Please set API key first.")
+            return None
+
+        tokens = estimate_tokens(prompt)
+        tried = set()
+        deadline = time.monotonic() + timeout if timeout else None
+        with tracing.span('model.call', stage=stage, label=label) as span:
+            while True:
+                route = self._acquire_route(stage, tokens, tried, deadline)
+                request_options = self._request_options(deadline)
+                span.set(model=route.model, key=mask_key(route.api_key))
+                try:
+                    response = self._route_model(route).generate_content(prompt, request_options=request_options)
+                    self._record_usage(stage, response, label, route)
+                    span.set(bytes=len(response.text.encode()))
+                    return response.text
+                except Exception as e:
+                    if is_quota_error(e):
+                        self._on_route_quota_error(route, tried, label, e)
+                        span.add('retries')
+                        continue
+                    span.fail(e)
+                    handle_error(f"Failed to send message: {e}")
+                    return None
+
+    def generate_stream(self, prompt, stage='code_generator', label=None, timeout=None):
+        """Sends a single stateless request and yields the response text in chunks as they arrive.
+
+        Routed like generate(). A quota error before the first chunk moves on to
+        another route; once text has been yielded it raises QuotaExceededError.
+        Raises QuotaExceededError when every route is exhausted; other errors are
+        logged and raised as StreamInterruptedError, so a partial response is
+        never mistaken for a complete one.
+        """
+        if self.router is None or not self.models:
+            handle_error("Gemini model not initialized. Please set API key first.")
+            return
+
+        tokens = estimate_tokens(prompt)
+        tried = set()
+        deadline = time.monotonic() + timeout if timeout else None
+        with tracing.span('model.call', stage=stage, label=label, streamed=True) as span:
+            while True:
+                route = self._acquire_route(stage, tokens, tried, deadline)
+                request_options = self._request_options(deadline)
+                span.set(model=route.model, key=mask_key(route.api_key))
+                started = False
+                started_at = time.perf_counter()
+                try:
+                    response = self._route_model(route).generate_content(
+                        prompt, stream=True, request_options=request_options
+                    )
+                    for chunk in response:
+                        try:
+                            text = chunk.text
+                        except ValueError:
+                            # Chunks without text parts (e.g. only safety ratings)
+                            continue
+                        if text:
+                            if not started:
+                                span.set(first_chunk_seconds=round(time.perf_counter() - started_at, 3))
+                            started = True
+                            span.add('bytes', len(text.encode()))
+                            yield text
+                    self._record_usage(stage, response, label, route)
+                    return
+                except Exception as e:
+                    if is_quota_error(e):
+                        if not started:
+                            self._on_route_quota_error(route, tried, label, e)
+                            span.add('retries')
+                            continue
+                        self.router.mark_exhausted(route)
+                        raise QuotaExceededError(str(e)) from e
+                    span.fail(e)
+                    handle_error(f"Failed to stream message: {e}")
+                    raise StreamInterruptedError(str(e)) from e
+
+    def start_chat(self, history=None, stage='code_generator'):
+        """Explicitly opens a chat session, e.g. for a repair turn that needs earlier context."""
+        model = self.models.get(stage)
+        if model is None:
+            handle_error("Gemini model not initialized. Please set API key first.")
+            return None
+        self.chat_session = model.start_chat(history=history or [])
+        return self.chat_session
 
     def send_message(self, message):
-        """Sends a message to the Gemini model and returns the response."""
+        """Sends a message on the explicitly started chat session and returns the response.
+
+        Unlike generate(), every message and reply is kept in the session history.
+        """
         if not self.chat_session:
-            handle_error("Chat session not initialized. Please set API key first.")
+            handle_error("Chat session not initialized. Call start_chat() first.")
             return None
 
         try:
             response = self.chat_session.send_message(message)
+            self._record_usage('chat', response)
             return response.text
         except Exception as e:
             handle_error(f"Failed to send message: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def routing_stats(self):
+        """Per-key call, token and quota-error counters from the router."""
+        return self.router.stats() if self.router else []
+
+    def total_prompt_tokens(self):
+        """Sum of prompt tokens over every recorded call."""
+        with self._usage_lock:
+            return sum(usage['prompt_tokens'] for usage in self.usage_log)
\ No newline at end of file
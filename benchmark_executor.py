@@ -0,0 +1,67 @@
+import statistics
+import subprocess
+import sys
+import tempfile
+import os
+import time
+from worker_pool import WorkerPool
+
+# A typical small generated scraper: imports the usual libraries and parses a page
+SAMPLE_SCRAPER = '''
+import json
+import logging
+import requests
+from bs4 import BeautifulSoup
+
+html = "<ul>" + "".join(f"<li class='item'><a href='/v{i}'>Item {i}</a></li>" for i in range(50)) + "</ul>"
+soup = BeautifulSoup(html, "html.parser")
+print(json.dumps([{"title": a.get_text(), "url": a["href"]} for a in soup.select("li.item a")]))
+'''
+
+def time_fresh_process(script_path, runs):
+    """Per-job seconds for today's approach: a new interpreter for every run."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, script_path], capture_output=True, text=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def time_worker_pool(runs, workers=1):
+    """Per-job seconds through warm workers, excluding the one-off warm-up."""
+    pool = WorkerPool(workers=workers)
+    try:
+        # The first job on each worker waits for its start-up; leave it out like a long-running app would
+        for _ in range(workers):
+            pool.run(SAMPLE_SCRAPER)
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = pool.run(SAMPLE_SCRAPER)
+            timings.append(time.perf_counter() - start)
+            if not result.ok:
+                raise RuntimeError(result.error)
+        return timings
+    finally:
+        pool.close()
+
+def summarize(name, timings):
+    print(f"{name:<16} mean {statistics.mean(timings) * 1000:8.1f} ms   "
+          f"median {statistics.median(timings) * 1000:8.1f} ms   "
+          f"max {max(timings) * 1000:8.1f} ms")
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as directory:
+        script_path = os.path.join(directory, "scraper.py")
+        with open(script_path, "w") as f:
+            f.write(SAMPLE_SCRAPER)
+        fresh = time_fresh_process(script_path, runs)
+    warm = time_worker_pool(runs)
+    print(f"Per-job overhead over {runs} runs:")
+    summarize("fresh process", fresh)
+    summarize("warm worker", warm)
+    print(f"Speed-up: {statistics.mean(fresh) / statistics.mean(warm):.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from config import STARTUP_CONFIG
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def parse_importtime(output):
+    """Turns `python -X importtime` output into (total ms, {module: cumulative ms})."""
+    total_us = 0
+    cumulative = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        module = name.strip()
+        cumulative[module] = int(cumulative_us) / 1000
+        # Nested imports are indented; the top-level ones add up to the whole start-up
+        if len(name) - len(name.lstrip()) == 1:
+            total_us += int(cumulative_us)
+    return total_us / 1000, cumulative
+
+def measure(module, runs):
+    """Imports module in `runs` fresh interpreters and returns (median timing, None).
+
+    Returns (None, error) when the module can't be imported here (e.g. no GUI toolkit installed).
+    """
+    totals = []
+    cumulative = {}
+    env = dict(os.environ, PYTHONPATH=PROJECT_DIR)
+    # Run from a scratch directory so log files created at import time don't land in the project
+    with tempfile.TemporaryDirectory() as scratch:
+        for _ in range(runs):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                cwd=scratch, env=env, capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'unknown error'
+            total, cumulative = parse_importtime(result.stderr)
+            totals.append(total)
+    return {
+        'total_ms': round(statistics.median(totals), 1),
+        'modules': cumulative,
+    }, None
+
+def slowest(timing, count=10):
+    """The count project and third-party imports with the highest cumulative time."""
+    top_level = {name: round(ms, 1) for name, ms in timing['modules'].items() if '.' not in name}
+    return sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:count]
+
+def load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checks the cold-start import time of the app against a budget.")
+    parser.add_argument('--record', action='store_true', help="Write the measured timings as the new baseline")
+    parser.add_argument('--budget', type=float, help="Milliseconds allowed per module (default: STARTUP_CONFIG)")
+    parser.add_argument('--skip', action='append', default=[], metavar='MODULE',
+                        help="Don't fail when MODULE can't be imported here, e.g. --skip main without Tk (repeatable)")
+    args = parser.parse_args(argv)
+
+    budget = args.budget or STARTUP_CONFIG['budget_ms']
+    baseline_path = os.path.join(PROJECT_DIR, STARTUP_CONFIG['baseline_file'])
+    baseline = load_baseline(baseline_path)
+    measured = {}
+    failures = []
+
+    for module in STARTUP_CONFIG['modules']:
+        timing, error = measure(module, STARTUP_CONFIG['runs'])
+        if timing is None:
+            # A module that can't be measured would otherwise pass unchecked
+            if module in args.skip:
+                print(f"{module:<8} skipped: {error}")
+            else:
+                failures.append(f"import {module} failed, so its start-up time is unchecked: {error} "
+                                f"(pass --skip {module} to allow this)")
+            continue
+        measured[module] = {'total_ms': timing['total_ms'], 'slowest': dict(slowest(timing))}
+
+        previous = baseline.get(module, {}).get('total_ms')
+        delta = f" ({timing['total_ms'] - previous:+.1f} ms vs baseline)" if previous else ""
+        print(f"{module:<8} {timing['total_ms']:8.1f} ms  budget {budget:.0f} ms{delta}")
+        for name, ms in measured[module]['slowest'].items():
+            print(f"    {name:<28} {ms:8.1f} ms")
+
+        if timing['total_ms'] > budget:
+            failures.append(f"import {module} took {timing['total_ms']:.1f} ms, over the {budget:.0f} ms budget")
+        eager = [name for name in STARTUP_CONFIG['lazy_modules'] if name in timing['modules']]
+        if eager:
+            failures.append(f"import {module} loads {', '.join(eager)}, which should load on first use")
+
+    if not measured:
+        failures.append("No start-up module could be imported")
+    if args.record and measured:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(measured, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {baseline_path}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
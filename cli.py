@@ -0,0 +1,187 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from api_handler import APIHandler
+from url_handler import URLHandler
+from gemini_api_handler import GeminiAPIHandler
+from jobs import Job, JobScheduler, DONE, CANCELLED
+from pipeline import ScrapePipeline
+from config import PIPELINE_CONFIG
+
+class ManifestError(ValueError):
+    """Raised when a job manifest can't be read or is malformed."""
+
+def load_manifest(path):
+    """Reads a JSON or YAML manifest of scrape jobs.
+
+    The manifest is either a list of jobs or an object with a "jobs" list and
+    optional "api_key" and "max_concurrent_jobs". Each job has "urls" (a list
+    or a comma-separated string) and "target" (or "target_description").
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+    except OSError as e:
+        raise ManifestError(f"Can't read manifest {path}: {e}") from e
+
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ManifestError("YAML manifests need PyYAML (pip install pyyaml)")
+        manifest = yaml.safe_load(text)
+    else:
+        try:
+            manifest = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ManifestError(f"Manifest {path} is not valid JSON: {e}") from e
+
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('jobs'), list) or not manifest['jobs']:
+        raise ManifestError("Manifest needs a non-empty list of jobs")
+
+    jobs = []
+    for index, entry in enumerate(manifest['jobs']):
+        urls = entry.get('urls') if isinstance(entry, dict) else None
+        if isinstance(urls, str):
+            urls = [url.strip() for url in urls.split(',')]
+        urls = [url for url in (urls or []) if url]
+        target = entry.get('target') or entry.get('target_description') if isinstance(entry, dict) else None
+        if not urls or not target:
+            raise ManifestError(f"Job #{index + 1} needs 'urls' and 'target'")
+        jobs.append({'urls': urls, 'target': target.strip()})
+    manifest['jobs'] = jobs
+    return manifest
+
+class ProgressPrinter:
+    """Writes one JSON object per line to stdout for every progress event."""
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        line = json.dumps({'event': event, 'time': round(time.time(), 3), **fields}, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+def run_job(job, pipeline, printer):
+    """Validates a job's URLs with its own URLHandler, then runs the pipeline on the valid ones."""
+    printer.emit('job_started', job=job.id, workspace=job.workspace.path)
+    url_handler = URLHandler()
+    for url in job.urls:
+        url_handler.add_url(url)
+    valid = url_handler.validate_urls(
+        on_result=lambda url, is_valid, message: printer.emit(
+            'url_validated', job=job.id, url=url, valid=is_valid, message=message
+        )
+    )
+    if not valid:
+        raise Exception("No valid URLs")
+    job.urls = list(url_handler.urls)
+    return pipeline.run(job, url_handler)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run scrape jobs from a manifest without the GUI, printing JSON progress lines."
+    )
+    parser.add_argument('manifest', help="JSON or YAML file listing jobs (urls + target)")
+    parser.add_argument('--api-key', help="Gemini API key(s), comma-separated; defaults to the manifest's "
+                                          "api_key or the GEMINI_API_KEY environment variable")
+    parser.add_argument('--max-jobs', type=int, help="Jobs run at the same time (default: manifest or config)")
+    parser.add_argument('--mode', choices=['code', 'spec'], help="Pipeline mode, overrides PIPELINE_CONFIG")
+    parser.add_argument('--skip-key-check', action='store_true', help="Don't validate the API key(s) first")
+    parser.add_argument('--log-level', default='WARNING', help="Level of log lines written to stderr")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    printer = ProgressPrinter(sys.stdout)
+    # Keep stdout machine-readable: everything else printed (e.g. by handle_error) goes to stderr
+    sys.stdout = sys.stderr
+
+    root_logger = logging.getLogger()
+    stderr_handler = logging.StreamHandler(sys.stderr)
+    stderr_handler.setLevel(args.log_level.upper())
+    stderr_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    # Handlers set up before this point keep the level they got from the root logger
+    for handler in root_logger.handlers:
+        if handler.level == logging.NOTSET:
+            handler.setLevel(root_logger.level)
+    # The root logger lets INFO through so every job's log gets it, whatever stderr shows
+    root_logger.setLevel(min(logging.INFO, stderr_handler.level))
+    root_logger.addHandler(stderr_handler)
+
+    try:
+        manifest = load_manifest(args.manifest)
+    except ManifestError as e:
+        printer.emit('error', message=str(e))
+        return 2
+
+    api_key = args.api_key or manifest.get('api_key') or os.environ.get('GEMINI_API_KEY')
+    if not api_key:
+        printer.emit('error', message="No API key: pass --api-key, set api_key in the manifest or GEMINI_API_KEY")
+        return 2
+    if args.mode:
+        PIPELINE_CONFIG['mode'] = args.mode
+
+    api_handler = APIHandler()
+    api_handler.set_api_key(api_key)
+    if not api_handler.is_ready() or (not args.skip_key_check and not api_handler.validate_api_key()):
+        printer.emit('error', message="API key validation failed")
+        return 2
+
+    pipeline = ScrapePipeline(
+        None, GeminiAPIHandler(api_handler),
+        on_progress=lambda job, value, status_text: printer.emit(
+            'progress', job=job.id, percent=value, message=status_text
+        )
+    )
+    scheduler = JobScheduler(
+        max_concurrent_jobs=args.max_jobs or manifest.get('max_concurrent_jobs'),
+        max_pending_jobs=len(manifest['jobs'])
+    )
+
+    jobs = []
+    for entry in manifest['jobs']:
+        job = Job(entry['urls'], entry['target'])
+        scheduler.submit(job, lambda job: run_job(job, pipeline, printer))
+        printer.emit('job_queued', job=job.id, urls=job.urls, target=job.target_description)
+        jobs.append(job)
+
+    def on_interrupt(signum, frame):
+        # The first Ctrl+C cancels the jobs and lets them wind down; a second one exits at once
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        scheduler.cancel_all()
+    signal.signal(signal.SIGINT, on_interrupt)
+
+    for job in jobs:
+        job.future.result()
+        printer.emit(
+            'job_finished', job=job.id, status=job.status, error=job.error,
+            workspace=job.workspace.path,
+            output_file=job.workspace.output_file if job.status == DONE else None,
+            trace_file=job.workspace.trace_file if job.trace_summary is not None else None,
+            seconds=round(job.finished_at - job.started_at, 3)
+        )
+        if job.trace_summary is not None:
+            printer.emit('trace_summary', job=job.id, spans=[
+                {name: round(value, 3) if isinstance(value, float) else value for name, value in row.items()}
+                for row in job.trace_summary
+            ])
+    scheduler.shutdown()
+
+    succeeded = sum(1 for job in jobs if job.status == DONE)
+    cancelled = sum(1 for job in jobs if job.status == CANCELLED)
+    printer.emit('summary', jobs=len(jobs), succeeded=succeeded, failed=len(jobs) - succeeded - cancelled,
+                 cancelled=cancelled)
+    return 0 if succeeded == len(jobs) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
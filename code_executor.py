@@ -1,44 +1,137 @@
 import subprocess
 import os
+import sys
+import json
+import logging
+import tracing
 from utils import handle_error
+from extraction_engine import ExtractionEngine
+from worker_pool import get_worker_pool
+from scraper_runtime import write_snapshot, SNAPSHOT_ENV
+from config import EXECUTOR_CONFIG
+
+# Generated scrapers import scraper_runtime from here wherever their workspace is
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 class CodeExecutor:
-    def __init__(self):
-        self.output_file = "scraped_data.txt"
+    def __init__(self, workspace=None):
+        """With a jobs.Workspace every file goes to that job's directory, else to the current one."""
+        self.workspace = workspace
+        self.code_file = workspace.code_file if workspace else "scraper.py"
+        self.output_file = workspace.output_file if workspace else "scraped_data.txt"
+        # Prefetched pages handed to the scraper through scraper_runtime.get_html
+        self.snapshot_dir = workspace.snapshot_dir if workspace else ".snapshot"
+        self.working_dir = workspace.path if workspace else None
 
     def save_code(self, code):
         """Saves the generated code to a file."""
         try:
-            with open("scraper.py", "w") as f:
+            with open(self.code_file, "w") as f:
                 f.write(code)
             return True
         except Exception as e:
             handle_error(f"Failed to save code: {e}")
             return False
 
-    def execute_code(self):
-        """Executes the generated code and captures output."""
+    def _run_in_pool(self, pool, snapshot_dir=None):
+        """Runs the saved scraper in a warm worker. Returns (stdout, stderr), or None when the job failed."""
+        with open(self.code_file) as f:
+            code = f.read()
+        result = pool.run(code, cwd=self.working_dir, script_path=os.path.abspath(self.code_file),
+                          snapshot_dir=snapshot_dir)
+        logging.info(f"Scraper ran in a warm worker in {result.elapsed:.2f}s")
+        tracing.current_span().set(timed_out=result.timed_out, crashed=result.crashed)
+        if not result.ok:
+            handle_error(f"Error during code execution:\n{result.error}")
+            return None
+        return result.stdout, result.stderr
+
+    def _run_in_subprocess(self, snapshot_dir=None):
+        """Runs the saved scraper in a fresh interpreter. Returns (stdout, stderr), or None on timeout."""
+        # Make the scraper file executable
+        os.chmod(self.code_file, 0o755)
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [PROJECT_DIR, env.get('PYTHONPATH')]))
+        if snapshot_dir:
+            env[SNAPSHOT_ENV] = snapshot_dir
+        process = subprocess.Popen([sys.executable, os.path.abspath(self.code_file)],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   text=True,
+                                   cwd=self.working_dir,
+                                   env=env)
         try:
-            # Make the scraper file executable
-            os.chmod("scraper.py", 0o755)
-
-            # Run the scraper and capture output
-            process = subprocess.Popen(["python", "scraper.py"],
-                                       stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE,
-                                       text=True)
-            stdout, stderr = process.communicate()
-
-            if stderr:
-                handle_error(f"Error during code execution:\n{stderr}")
+            return process.communicate(timeout=EXECUTOR_CONFIG['timeout'])
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            tracing.current_span().set(timed_out=True)
+            handle_error(f"Scraper timed out after {EXECUTOR_CONFIG['timeout']} seconds")
+            return None
+
+    def save_snapshot(self, html_content):
+        """Writes the fetched pages where scraper_runtime.get_html finds them. Returns the directory."""
+        snapshot_dir = os.path.abspath(self.snapshot_dir)
+        write_snapshot(snapshot_dir, html_content)
+        return snapshot_dir
+
+    def execute_code(self, html_content=None):
+        """Executes the generated code and captures output.
+
+        With html_content ({url: html}) the scraper reads those pages through
+        scraper_runtime.get_html instead of downloading them again.
+        """
+        with tracing.span('scraper.execute') as span:
+            try:
+                snapshot_dir = self.save_snapshot(html_content) if html_content else None
+
+                # Run the scraper and capture output
+                pool = get_worker_pool()
+                span.set(runner='worker' if pool else 'subprocess')
+                output = self._run_in_pool(pool, snapshot_dir) if pool else self._run_in_subprocess(snapshot_dir)
+                if output is None:
+                    span.fail("Scraper did not finish")
+                    return None
+                stdout, stderr = output
+
+                if stderr:
+                    span.fail("Scraper wrote to stderr")
+                    handle_error(f"Error during code execution:\n{stderr}")
+                    return None
+
+                # Save the output to a file
+                with open(self.output_file, "w") as f:
+                    f.write(stdout)
+
+                span.set(bytes=len(stdout.encode()))
+                return stdout
+
+            except Exception as e:
+                span.fail(e)
+                handle_error(f"Failed to execute code: {e}")
                 return None
 
-            # Save the output to a file
-            with open(self.output_file, "w") as f:
-                f.write(stdout)
+    def execute_spec(self, spec, html_content):
+        """Applies a declarative extraction spec to the fetched pages in-process and captures output."""
+        with tracing.span('scraper.execute', runner='spec') as span:
+            try:
+                results = ExtractionEngine(spec).extract_all(html_content)
+                for url, records in results.items():
+                    logging.info(f"Extracted {len(records)} records from {url}")
+                if not any(results.values()):
+                    span.fail("No records matched")
+                    handle_error("Extraction spec matched no records")
+                    return None
 
-            return stdout
+                output = json.dumps(results, indent=2, ensure_ascii=False)
+                with open(self.output_file, "w", encoding="utf-8") as f:
+                    f.write(output)
 
-        except Exception as e:
-            handle_error(f"Failed to execute code: {e}")
-            return None
\ No newline at end of file
+                span.set(bytes=len(output.encode()))
+                return output
+
+            except Exception as e:
+                span.fail(e)
+                handle_error(f"Failed to apply extraction spec: {e}")
+                return None
@@ -38,6 +38,23 @@ PROMPTS = {
 	
 	Format your response as valid JSON only.
 	'''.strip(),
+
+	'html_batch_analysis': '''
+	You are a specialized HTML analyzer. Your task is to extract and identify relevant tags and elements from each of the provided HTML pages.
+	
+	Target Description: {target_description}
+	
+	Each page starts with a line "=== URL: <url> ===" followed by its HTML content.
+	
+	{pages}
+	
+	For every page, provide a structured JSON output containing:
+	1. Relevant HTML tags and their attributes
+	2. CSS selectors for target elements
+	3. Data structure patterns found
+	
+	Answer with one section per page, in the same order as the pages. Start each section with the page's "=== URL: <url> ===" line, followed by that page's analysis as valid JSON only.
+	'''.strip(),
 	
 	'code_generation': '''
 	You are a Python code generator. Based on the following HTML analysis results, generate clean, production-ready Python code.
@@ -46,11 +63,195 @@ PROMPTS = {
 	{analysis_results}
 	
 	Requirements:
+	- The pages are already downloaded: get each page's HTML with `from scraper_runtime import get_html` and `html = get_html(url)` instead of downloading it with requests
+	- Scrape the URLs listed in the analysis results
 	- Use BeautifulSoup4 for parsing
 	- Include proper error handling
 	- Include logging
 	- Return structured data
 	
 	Generate only valid Python code without any explanatory text or markdown formatting.
+	'''.strip(),
+
+	'selector_spec': '''
+	You are a specialized HTML analyzer. Instead of code, describe how to extract the target data from the provided HTML as a declarative JSON extraction spec.
+	
+	URL: {url}
+	Target Description: {target_description}
+	
+	HTML Content:
+	{html}
+	
+	The spec has this shape:
+	{{
+	  "records": "CSS selector matching one element per record (omit for a single record per page)",
+	  "fields": {{
+	    "<field name>": {{
+	      "selector": "CSS selector relative to the record element",
+	      "attribute": "attribute to read, omit to read the element's text",
+	      "transforms": ["strip", "lower", "upper", "collapse_whitespace", "int", "float", "absolute_url", {{"regex": "pattern with one group"}}, {{"replace": ["old", "new"]}}],
+	      "multiple": false
+	    }}
+	  }},
+	  "limit": null
+	}}
+	
+	Only list the transforms a field needs. Use selectors that hold for every similar page of this site, not just this one.
+	Format your response as valid JSON only.
 	'''.strip()
-}
\ No newline at end of file
+}
+
+# Fetch Engine Configuration
+FETCH_CONFIG = {
+	'max_concurrency': 10,      # Global cap on in-flight URL fetches
+	'request_timeout': 10,      # Timeout for each individual HTTP attempt (seconds)
+	'deadline': 30,             # Overall deadline per URL, direct + proxy attempts (seconds)
+	'reuse_validation_response': True,  # Validate with GET and hand the body to the fetcher
+	'validation_per_host': 2,   # Max concurrent validation requests to the same host
+}
+
+# Shared HTTP Client Configuration
+HTTP_CONFIG = {
+	'pool_connections': 32,     # Number of per-host connection pools kept alive
+	'pool_maxsize': 10,         # Max keep-alive connections per host
+	'http2': False,             # Use HTTP/2 for direct requests (requires httpx[http2])
+	'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
+}
+
+# Proxy Pool Configuration
+PROXY_CONFIG = {
+	'proxy_file': 'proxy.json',
+	'stats_file': 'proxy_stats.json',     # Per-proxy health persisted between runs
+	'fallback_proxy': 'http://127.0.0.1:8080',  # Used when proxy.json is missing or empty
+	'ewma_alpha': 0.3,          # Weight of the newest latency sample
+	'initial_latency': 2.0,     # Assumed latency (seconds) for proxies never measured
+	'failure_threshold': 3,     # Consecutive failures before a proxy's circuit opens
+	'cooldown': 60,             # Seconds before an open circuit allows a half-open probe
+	'max_cooldown': 900,        # Upper bound for the doubling cooldown
+	'max_attempts': 3,          # Proxies tried per request by make_request
+	'store_file': 'proxies.db', # SQLite proxy store used by generate_proxy_json.py
+	'max_age': 3600,            # Seconds before a stored proxy's check is considered stale
+	'background_refresh': False,  # Refresh the proxy store while the GUI runs
+	'refresh_interval': 900,    # Seconds between background refreshes
+}
+
+# HTTP Response Cache Configuration
+CACHE_CONFIG = {
+	'enabled': True,
+	'directory': '.http_cache',
+	'ttl': 3600,                # Seconds a cached page is served without revalidation
+	'max_bytes': 200 * 1024 * 1024,  # LRU eviction once stored bodies exceed this
+	'vary_headers': ['Accept', 'Accept-Language', 'Cookie'],  # Request headers that are part of the key
+}
+
+# HTML Reduction Configuration
+REDUCER_CONFIG = {
+	'max_attribute_length': 60, # Longer attribute values are cut with an ellipsis
+	'max_text_length': 80,      # Longer text nodes are cut with an ellipsis
+	'max_prompt_chars': 30000,  # Budget for the reduced page in the analysis prompt
+}
+
+# LLM Response Cache Configuration
+LLM_CACHE_CONFIG = {
+	'enabled': True,
+	'bypass': False,            # Skip cache lookups and stores for every call
+	'path': '.llm_cache/responses.db',
+	'max_entries': 2000,        # LRU eviction beyond this many responses
+	'max_bytes': 50 * 1024 * 1024,  # ...or beyond this much response text
+}
+
+# Gemini Rate Limiting Configuration
+RATE_LIMIT_CONFIG = {
+	'requests_per_minute': 10,
+	'tokens_per_minute': 250000,
+	'analysis_concurrency': 4,  # URLs analyzed at the same time
+	'max_retries': 3,           # Retries after a 429 / quota error
+	'initial_backoff': 2,       # Seconds paused after the first quota error
+	'max_backoff': 60,          # Upper bound for the doubling pause
+}
+
+# Multi-key and Model Tier Routing Configuration
+ROUTING_CONFIG = {
+	'api_keys': [],             # Extra Gemini API keys, used alongside the keys entered in the GUI
+	'key_requests_per_minute': 10,   # Quota of each individual key
+	'key_tokens_per_minute': 250000,
+	'key_cooldown': 60,         # Seconds a model is skipped on a key after a quota error
+	# Tiers per stage, in preference order. max_input_tokens limits a tier to small prompts.
+	'tiers': {
+		'html_analyzer': [
+			{'model': 'gemini-1.5-flash', 'max_input_tokens': 8000},
+			{'model': 'gemini-exp-1206'},
+			{'model': 'gemini-1.5-pro'},
+		],
+		'code_generator': [
+			{'model': 'gemini-exp-1206'},
+			{'model': 'gemini-1.5-pro'},
+		],
+	},
+}
+
+# Batched HTML Analysis Configuration
+BATCH_CONFIG = {
+	'enabled': False,           # Pack several pages into one html_analysis request
+	'max_batch_tokens': 24000,  # Budget for the reduced pages packed into one prompt
+	'max_pages_per_batch': 8,
+}
+
+# Scraper Registry Configuration
+REGISTRY_CONFIG = {
+	'enabled': True,
+	'path': '.scraper_registry/scrapers.db',
+	'similarity_threshold': 0.8,  # Minimum DOM structure similarity to reuse a stored scraper
+	'shingle_size': 2,          # Consecutive element paths per shingle
+	'sketch_size': 512,         # Shingle hashes kept per fingerprint
+	'max_entries': 500,         # Least recently used scrapers are dropped beyond this
+}
+
+# Pipeline Configuration
+PIPELINE_CONFIG = {
+	'mode': 'code',             # 'code': generate and run a Python scraper, 'spec': apply a JSON selector spec in-process
+	'queue_size': 4,            # Items waiting between two stages; a full queue pauses the stage feeding it
+	'stage_workers': {          # Threads per stage; pages flow through fetch, reduce and analyze one by one
+		'fetch': 4,
+		'reduce': 1,
+		'analyze': 4,
+		'generate': 1,
+		'execute': 1,
+	},
+}
+
+# Scraper Execution Configuration
+EXECUTOR_CONFIG = {
+	'use_worker_pool': True,    # Run generated scrapers in warm worker processes instead of a fresh interpreter
+	'workers': 2,
+	'max_jobs_per_worker': 20,  # Replace a worker after this many jobs
+	'timeout': 120,             # Wall-clock seconds per scraper run
+	'cpu_limit': 60,            # CPU seconds per scraper run (POSIX only)
+	'memory_limit': 2 * 1024 * 1024 * 1024,  # Address space per worker in bytes (POSIX only)
+	'preload_modules': ['requests', 'bs4', 'json', 'logging', 're', 'csv'],
+	'fork_per_job': True,       # Run each job in a child forked from the warm worker so nothing it changes carries over (POSIX only)
+}
+
+# Scrape Job Configuration
+JOBS_CONFIG = {
+	'workspace_root': 'jobs',   # Each job gets its own directory below this
+	'max_concurrent_jobs': 2,
+	'max_pending_jobs': 10,     # Further jobs are rejected while this many wait
+	'keep_finished_jobs': 20,   # Finished jobs the scheduler remembers; older ones are dropped (their workspaces stay on disk)
+}
+
+# Start-up Time Configuration (checked by check_startup.py)
+STARTUP_CONFIG = {
+	'budget_ms': 400,           # Cold import of each start-up module must stay below this
+	'modules': ['main', 'cli'], # Entry points whose import is measured; one that can't be imported fails the check unless --skip'd
+	'lazy_modules': ['google.generativeai', 'docx', 'bs4'],  # Heavy libraries that must not load at start-up
+	'runs': 5,                  # Fresh interpreters per module; the median is compared to the budget
+	'baseline_file': 'startup_baseline.json',
+}
+
+# Tracing Configuration
+TRACING_CONFIG = {
+	'enabled': True,            # Record spans for every run into the job's workspace (trace.jsonl)
+	'metrics_file': 'metrics.prom',  # Histograms over all runs in Prometheus text format, rewritten after each run
+	'duration_buckets': [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120],  # Seconds
+}
@@ -0,0 +1,157 @@
+import json
+import re
+from urllib.parse import urljoin
+
+class SpecError(ValueError):
+    """Raised when a model-provided extraction spec is malformed."""
+
+def _parser_name():
+    """lxml parses several times faster than html.parser; use it when installed."""
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        return 'html.parser'
+    return 'lxml'
+
+PARSER = _parser_name()
+
+# A ```json (or bare ```) fence the model may wrap the spec in
+_FENCE = re.compile(r'```[a-zA-Z]*[ \t]*\n?(.*?)```', re.DOTALL)
+
+def _to_number(value, cast):
+    match = re.search(r'-?\d[\d,]*(?:\.\d+)?', value)
+    if not match:
+        return None
+    return cast(float(match.group(0).replace(',', '')))
+
+TRANSFORMS = {
+    'strip': lambda value, url: value.strip(),
+    'lower': lambda value, url: value.lower(),
+    'upper': lambda value, url: value.upper(),
+    'collapse_whitespace': lambda value, url: re.sub(r'\s+', ' ', value).strip(),
+    'int': lambda value, url: _to_number(value, int),
+    'float': lambda value, url: _to_number(value, float),
+    'absolute_url': lambda value, url: urljoin(url, value) if url else value,
+}
+# Transforms that turn the text into a number, after which no text transform applies
+NUMERIC_TRANSFORMS = ('int', 'float')
+
+def _apply_transform(transform, value, url):
+    """Applies one transform: a TRANSFORMS name, {"regex": pattern} or {"replace": [old, new]}."""
+    if value is None:
+        return None
+    if isinstance(transform, str):
+        return TRANSFORMS[transform](value, url)
+    if 'regex' in transform:
+        match = re.search(transform['regex'], value)
+        if not match:
+            return None
+        return match.group(1) if match.groups() else match.group(0)
+    old, new = transform['replace']
+    return value.replace(old, new)
+
+def validate_spec(spec):
+    """Checks an extraction spec and fills in defaults. Returns the normalized spec.
+
+    A spec looks like:
+        {"records": "div.card",                 # optional, one record per match
+         "fields": {"title": {"selector": "h3 a", "attribute": "title",
+                              "transforms": ["strip"], "multiple": false}},
+         "limit": 50}                           # optional
+    A field may also be given as a bare selector string (its text is taken).
+    The numeric transforms (int, float) may only come last.
+    """
+    if not isinstance(spec, dict) or not isinstance(spec.get('fields'), dict) or not spec['fields']:
+        raise SpecError("Extraction spec needs a non-empty 'fields' object")
+    records = spec.get('records')
+    if records is not None and not isinstance(records, str):
+        raise SpecError("'records' must be a CSS selector string")
+    fields = {}
+    for name, field in spec['fields'].items():
+        if isinstance(field, str):
+            field = {'selector': field}
+        if not isinstance(field, dict):
+            raise SpecError(f"Field '{name}' must be a selector string or an object")
+        transforms = field.get('transforms') or []
+        if not isinstance(transforms, list):
+            raise SpecError(f"'transforms' of field '{name}' must be a list")
+        for position, transform in enumerate(transforms):
+            if isinstance(transform, str):
+                if transform not in TRANSFORMS:
+                    raise SpecError(f"Unknown transform '{transform}' for field '{name}'")
+                if transform in NUMERIC_TRANSFORMS and position != len(transforms) - 1:
+                    raise SpecError(f"Transform '{transform}' must come last for field '{name}'")
+            elif isinstance(transform, dict) and 'regex' in transform:
+                try:
+                    re.compile(transform['regex'])
+                except (re.error, TypeError) as e:
+                    raise SpecError(f"Invalid regex {transform['regex']!r} for field '{name}': {e}") from e
+            elif isinstance(transform, dict) and 'replace' in transform:
+                pair = transform['replace']
+                if not (isinstance(pair, list) and len(pair) == 2 and all(isinstance(part, str) for part in pair)):
+                    raise SpecError(f"'replace' for field '{name}' must be [old, new]")
+            else:
+                raise SpecError(f"Unsupported transform {transform!r} for field '{name}'")
+        fields[name] = {
+            'selector': field.get('selector') or None,
+            'attribute': field.get('attribute') or None,
+            'transforms': transforms,
+            'multiple': bool(field.get('multiple')),
+        }
+    limit = spec.get('limit')
+    return {'records': records, 'fields': fields, 'limit': int(limit) if limit else None}
+
+def parse_spec(response_text):
+    """Parses a model response holding a JSON extraction spec, with or without a code fence."""
+    match = _FENCE.search(response_text)
+    text = match.group(1) if match else response_text.strip()
+    try:
+        spec = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise SpecError(f"Extraction spec is not valid JSON: {e}") from e
+    return validate_spec(spec)
+
+def _field_value(element, field, url):
+    if field['attribute']:
+        value = element.get(field['attribute'])
+        if isinstance(value, list):
+            # Multi-valued attributes such as class
+            value = ' '.join(value)
+    else:
+        value = element.get_text(' ', strip=True)
+    for transform in field['transforms']:
+        value = _apply_transform(transform, value, url)
+    return value
+
+def _extract_field(scope, field, url):
+    if field['multiple']:
+        elements = scope.select(field['selector']) if field['selector'] else [scope]
+        return [value for value in (_field_value(element, field, url) for element in elements) if value is not None]
+    element = scope.select_one(field['selector']) if field['selector'] else scope
+    return _field_value(element, field, url) if element is not None else None
+
+class ExtractionEngine:
+    """Applies a declarative extraction spec to already-fetched HTML in-process."""
+    def __init__(self, spec):
+        # Normalized specs pass validation unchanged, so checking again is always safe
+        self.spec = validate_spec(spec)
+
+    def extract(self, html, url=None):
+        """Returns the list of records the spec yields for one page."""
+        # Imported here so loading the pipeline doesn't pay for BeautifulSoup until a spec runs
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, PARSER)
+        scopes = soup.select(self.spec['records']) if self.spec['records'] else [soup]
+        if self.spec['limit']:
+            scopes = scopes[:self.spec['limit']]
+        records = []
+        for scope in scopes:
+            record = {name: _extract_field(scope, field, url) for name, field in self.spec['fields'].items()}
+            # Skip records where no field matched at all
+            if any(value not in (None, '', []) for value in record.values()):
+                records.append(record)
+        return records
+
+    def extract_all(self, html_content):
+        """Applies the spec to every page of {url: html}. Returns {url: records}."""
+        return {url: self.extract(html, url) for url, html in html_content.items()}
@@ -0,0 +1,137 @@
+import asyncio
+import queue
+import threading
+import time
+import tracing
+from concurrent.futures import ThreadPoolExecutor
+from utils import handle_error, make_request
+from config import FETCH_CONFIG
+
+class FetchResult:
+    """Outcome of fetching a single URL."""
+    def __init__(self, url, response=None, error=None, elapsed=0.0, via_proxy=False):
+        self.url = url
+        self.response = response
+        self.error = error
+        self.elapsed = elapsed
+        self.via_proxy = via_proxy
+
+    @property
+    def ok(self):
+        return self.response is not None
+
+class AsyncFetchEngine:
+    def __init__(self, max_concurrency=None, request_timeout=None, deadline=None):
+        self.max_concurrency = max_concurrency or FETCH_CONFIG['max_concurrency']
+        self.request_timeout = request_timeout or FETCH_CONFIG['request_timeout']
+        self.deadline = deadline or FETCH_CONFIG['deadline']
+
+    async def _fetch_with_fallback(self, url, executor):
+        """Tries a direct request first, then falls back to the proxy."""
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(executor, tracing.wrap(make_request), url, False, self.request_timeout)
+        if response:
+            return response, False
+
+        handle_error(f"Direct connection failed for {url}, attempting with proxy...")
+        tracing.current_span().add('retries')
+        response = await loop.run_in_executor(executor, tracing.wrap(make_request), url, True, self.request_timeout)
+        return response, True
+
+    async def _fetch_one(self, url, semaphore, executor):
+        """Fetches a single URL under the concurrency cap and per-URL deadline."""
+        async with semaphore:
+            with tracing.span('fetch', url=url) as span:
+                return self._traced(span, await self._fetch_until_deadline(url, executor))
+
+    def _traced(self, span, result):
+        span.set(via_proxy=result.via_proxy, bytes=len(result.response.content) if result.ok else 0)
+        if not result.ok:
+            span.fail(result.error)
+        return result
+
+    def _result(self, url, response, via_proxy, start):
+        if not response:
+            return FetchResult(url, error="Direct and proxy connections failed",
+                               elapsed=time.monotonic() - start, via_proxy=via_proxy)
+        return FetchResult(url, response=response, elapsed=time.monotonic() - start,
+                           via_proxy=via_proxy)
+
+    async def _fetch_until_deadline(self, url, executor):
+        start = time.monotonic()
+        try:
+            response, via_proxy = await asyncio.wait_for(
+                self._fetch_with_fallback(url, executor),
+                timeout=self.deadline
+            )
+        except asyncio.TimeoutError:
+            return FetchResult(url, error=f"Deadline of {self.deadline} seconds exceeded",
+                               elapsed=time.monotonic() - start)
+        except Exception as e:
+            return FetchResult(url, error=str(e), elapsed=time.monotonic() - start)
+        return self._result(url, response, via_proxy, start)
+
+    async def fetch(self, urls):
+        """Fetches URLs concurrently, yielding a FetchResult as each one completes."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        tasks = [asyncio.ensure_future(self._fetch_one(url, semaphore, executor)) for url in urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Blocking calls past their deadline are bounded by request_timeout, don't wait on them
+            executor.shutdown(wait=False)
+
+    def fetch_one(self, url):
+        """Fetches a single URL on the calling thread, with the same fallback as fetch().
+
+        Calls make_request directly, without an event loop or thread pool per page.
+        A blocking request can't be abandoned at the deadline, so the proxy attempt
+        gets only the time that is left and is skipped once the deadline has passed.
+        """
+        with tracing.span('fetch', url=url) as span:
+            start = time.monotonic()
+            try:
+                response, via_proxy = make_request(url, False, self.request_timeout), False
+                if not response:
+                    remaining = self.deadline - (time.monotonic() - start)
+                    if remaining <= 0:
+                        return self._traced(span, FetchResult(url, error=f"Deadline of {self.deadline} seconds exceeded",
+                                                              elapsed=time.monotonic() - start))
+                    handle_error(f"Direct connection failed for {url}, attempting with proxy...")
+                    span.add('retries')
+                    response, via_proxy = make_request(url, True, min(self.request_timeout, remaining)), True
+            except Exception as e:
+                return self._traced(span, FetchResult(url, error=str(e), elapsed=time.monotonic() - start))
+            return self._traced(span, self._result(url, response, via_proxy, start))
+
+    def iter_fetch(self, urls):
+        """Synchronous wrapper around fetch() for callers outside an event loop.
+
+        The event loop runs on a background thread so results can be consumed
+        as they complete from regular (e.g. GUI worker) threads.
+        """
+        results = queue.Queue()
+        done = object()
+
+        def _runner():
+            async def _drain():
+                async for result in self.fetch(urls):
+                    results.put(result)
+            try:
+                asyncio.run(_drain())
+            except Exception as e:
+                handle_error(f"Fetch engine failed: {e}")
+            finally:
+                results.put(done)
+
+        thread = threading.Thread(target=tracing.wrap(_runner), daemon=True)
+        thread.start()
+        while True:
+            result = results.get()
+            if result is done:
+                break
+            yield result
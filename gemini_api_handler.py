@@ -1,91 +1,415 @@
-from utils import handle_error, extract_python_code
-from config import PROMPTS
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from utils import handle_error, extract_python_code, IncrementalCodeExtractor
+from config import PROMPTS, REDUCER_CONFIG, LLM_CACHE_CONFIG, RATE_LIMIT_CONFIG, BATCH_CONFIG
+from html_reducer import reduce_html, estimate_tokens
+from llm_cache import get_llm_cache
+from rate_limiter import RateLimiter
+from api_handler import QuotaExceededError, StreamInterruptedError
+from extraction_engine import parse_spec, SpecError
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+import contextvars
+import logging
+import re
 import threading
 import time
-import google.generativeai as genai
+import tracing
+
+# One worker pool shared by every model call. Calls abandoned at their deadline
+# keep a worker only until the request-level timeout aborts them.
+MODEL_CALL_POOL = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini-call")
+
+# Cancel event of the run the current thread or task is working for, see start_run()
+_run_cancel = contextvars.ContextVar('gemini_run_cancel', default=None)
+
+# Which model configuration (see config.AI_CONFIG) each prompt template runs on
+TEMPLATE_STAGES = {
+    'html_analysis': 'html_analyzer',
+    'html_batch_analysis': 'html_analyzer',
+    'code_generation': 'code_generator',
+    'selector_spec': 'code_generator',
+}
+
+# Line that opens each page's section in batched prompts and answers
+BATCH_SECTION_MARKER = "=== URL: {url} ==="
+BATCH_SECTION_PATTERN = re.compile(r'^\s*=== URL: (.+?) ===\s*$', re.MULTILINE)
+
+def pack_batches(pages, max_tokens=None, max_pages=None):
+    """Packs {url: reduced_html} into batches of at most max_tokens estimated tokens.
+
+    First-fit decreasing: the largest pages are placed first, each into the first
+    batch with room left. A page over the budget on its own gets a batch to itself.
+    Returns a list of [(url, reduced_html), ...] batches.
+    """
+    max_tokens = max_tokens or BATCH_CONFIG['max_batch_tokens']
+    max_pages = max_pages or BATCH_CONFIG['max_pages_per_batch']
+    batches = []
+    for url, html in sorted(pages.items(), key=lambda page: len(page[1]), reverse=True):
+        tokens = estimate_tokens(html) + estimate_tokens(BATCH_SECTION_MARKER.format(url=url))
+        for batch in batches:
+            if batch['tokens'] + tokens <= max_tokens and len(batch['pages']) < max_pages:
+                batch['pages'].append((url, html))
+                batch['tokens'] += tokens
+                break
+        else:
+            batches.append({'pages': [(url, html)], 'tokens': tokens})
+    return [batch['pages'] for batch in batches]
+
+def split_batch_sections(response_text, urls):
+    """Splits a batched answer into {url: section_text} for the URLs that were asked about."""
+    sections = {}
+    matches = list(BATCH_SECTION_PATTERN.finditer(response_text))
+    for index, match in enumerate(matches):
+        url = match.group(1).strip()
+        if url not in urls or url in sections:
+            continue
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(response_text)
+        sections[url] = response_text[match.end():end].strip()
+    return sections
 
 class GeminiAPIHandler:
-    def __init__(self, api_handler, timeout=60):
+    def __init__(self, api_handler, timeout=60, use_cache=None, batch_analysis=None):
         self.api_handler = api_handler
         self.timeout = timeout
+        # Pack several pages into one analysis request (see BATCH_CONFIG)
+        self.batch_analysis = BATCH_CONFIG['enabled'] if batch_analysis is None else batch_analysis
+        # Bypass the response cache with use_cache=False (or LLM_CACHE_CONFIG['bypass'])
+        self.use_cache = not LLM_CACHE_CONFIG['bypass'] if use_cache is None else use_cache
         self.current_task = None
-        self._stop_event = threading.Event()
+        self._metrics_lock = threading.Lock()
+        self.call_metrics = {
+            'calls': 0,
+            'completed': 0,
+            'timed_out': 0,
+            'cancelled_before_start': 0,
+            'abandoned': 0,
+            'abandoned_running': 0,
+        }
+        self.reduction_reports = {}
+        self.rate_limiter = RateLimiter()
+
+    def _count(self, name, amount=1):
+        with self._metrics_lock:
+            self.call_metrics[name] += amount
+
+    def _on_abandoned_done(self, future):
+        self._count('abandoned_running', -1)
 
     def _execute_with_timeout(self, func, *args):
-        """Execute a function with timeout."""
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(func, *args)
-            try:
-                return future.result(timeout=self.timeout)
-            except TimeoutError:
-                self._stop_event.set()
-                handle_error(f"Operation timed out after {self.timeout} seconds")
-                return None
-            finally:
-                self._stop_event.clear()
+        """Execute a function on the shared pool and return at the deadline.
+
+        On timeout the call is cancelled if it hasn't started. Otherwise it is
+        abandoned: control returns to the caller immediately, and the request is
+        left to be aborted by its own request-level timeout.
+        """
+        self._count('calls')
+        return self._await_deadline(MODEL_CALL_POOL.submit(tracing.wrap(func), *args))
 
-    def analyze_html(self, html_content, target_description):
-        """Sends HTML and target description to Gemini API for analysis with timeout."""
-        if not self.api_handler.chat_session:
-            handle_error("Chat session not initialized.")
+    def _await_deadline(self, result_future, worker_future=None):
+        """Waits for result_future until the deadline, cancelling or abandoning worker_future on timeout."""
+        worker_future = worker_future or result_future
+        try:
+            result = result_future.result(timeout=self.timeout)
+            self._count('completed')
+            return result
+        except TimeoutError:
+            self._count('timed_out')
+            if worker_future.cancel():
+                self._count('cancelled_before_start')
+            else:
+                self._count('abandoned')
+                self._count('abandoned_running')
+                worker_future.add_done_callback(self._on_abandoned_done)
+            handle_error(f"Operation timed out after {self.timeout} seconds")
             return None
 
-        analysis_results = {}
-        for url, html in html_content.items():
+    def get_call_metrics(self):
+        """Returns counters for completed, timed-out and abandoned model calls."""
+        with self._metrics_lock:
+            return dict(self.call_metrics)
+
+    def start_run(self, cancel_event=None):
+        """Sizes the rate limiter to the configured API keys and binds cancel_event to the calling run.
+
+        Model calls made from this context, including threads started through
+        tracing.wrap, stop once cancel_event is set. Every run brings its own
+        event, so cancelling one job leaves concurrent jobs alone.
+        """
+        _run_cancel.set(cancel_event)
+        self._scale_rate_limiter()
+
+    def _scale_rate_limiter(self):
+        # Each API key brings its own quota
+        self.rate_limiter.scale(self.api_handler.key_count())
+
+    def _send_prompt(self, template_name, label=None, on_chunk=None, complete=False, **inputs):
+        """Fills a prompt template and sends it as a stateless request.
+
+        The request carries only this prompt, never earlier calls. Answers come
+        from the LLM cache when possible. With on_chunk the response is streamed
+        and on_chunk(text_so_far) is called as it grows. Streamed calls return
+        once the first code block is complete, or only at the end with complete=True.
+        """
+        template = PROMPTS[template_name]
+        stage = TEMPLATE_STAGES[template_name]
+        prompt = template.format(**inputs)
+        with tracing.span('llm.prompt', template=template_name, label=label, bytes=len(prompt.encode())) as span:
+            cache = get_llm_cache() if self.use_cache else None
+            store = None
+            if cache is not None:
+                # Keyed by the model tier this prompt size is routed to
+                stage_config = self.api_handler.stage_config(stage, estimate_tokens(prompt))
+                model = stage_config['model']
+                key = cache.make_key(model, stage_config['generation_config'], template, inputs)
+                cached = cache.get(key)
+                span.set(cache='miss' if cached is None else 'hit')
+                if cached is not None:
+                    logging.info(f"LLM cache hit for {template_name}")
+                    if on_chunk:
+                        on_chunk(cached)
+                    return cached
+                store = lambda response: cache.put(key, model, response)
+
+            if on_chunk:
+                return self._stream_model(prompt, stage, label, on_chunk, store, complete)
+
+            response = self._call_model(prompt, stage, label)
+            if response and store:
+                store(response)
+            return response
+
+    def _call_model(self, prompt, stage, label=None):
+        """Sends one prompt and waits for the complete response."""
+        return self._with_quota_retries(
+            prompt, label,
+            lambda: self._execute_with_timeout(self.api_handler.generate, prompt, stage, label, self.timeout)
+        )
+
+    def _stream_model(self, prompt, stage, label, on_chunk, store=None, complete=False):
+        """Streams one prompt's response, see _consume_stream."""
+        return self._with_quota_retries(
+            prompt, label,
+            lambda: self._consume_stream(prompt, stage, label, on_chunk, store, complete)
+        )
+
+    def _consume_stream(self, prompt, stage, label, on_chunk, store=None, complete=False):
+        """Streams a response on the shared pool, returning once its first code block is complete.
+
+        The returned text ends with that block's closing fence, so extract_python_code
+        gives the same code as for the full response. The rest of the stream keeps
+        feeding on_chunk in the background, and the full text is cached when it ends.
+        With complete=True it only returns once the whole response has arrived.
+        A response without any code fence (as the prompts ask for) is returned
+        whole once the stream ends.
+
+        A stream that breaks off or ends inside an unclosed code block raises
+        StreamInterruptedError and is not cached.
+        """
+        ready = Future()
+
+        def _consume():
+            extractor = IncrementalCodeExtractor()
+            for chunk in self.api_handler.generate_stream(prompt, stage, label, self.timeout):
+                extractor.feed(chunk)
+                on_chunk(extractor.text)
+                if not complete and extractor.code is not None and not ready.done():
+                    ready.set_result(extractor.text)
+            if extractor.truncated:
+                raise StreamInterruptedError("Response ended inside an unclosed code block")
+            # Only a response that finished normally is worth caching
+            if store and extractor.text:
+                store(extractor.text)
+            return extractor.text or None
+
+        def _finished(worker):
+            # Runs on the consumer thread after _consume, so it can't race the set_result above
+            if ready.done() or worker.cancelled():
+                return
+            if worker.exception() is not None:
+                ready.set_exception(worker.exception())
+            else:
+                ready.set_result(worker.result())
+
+        self._count('calls')
+        worker = MODEL_CALL_POOL.submit(tracing.wrap(_consume))
+        worker.add_done_callback(_finished)
+        return self._await_deadline(ready, worker)
+
+    def _with_quota_retries(self, prompt, label, call):
+        """Runs call() under the rate limiter, backing off and retrying on quota errors.
+
+        Time spent waiting for the rate limiter doesn't count against the call timeout.
+        """
+        max_retries = RATE_LIMIT_CONFIG['max_retries']
+        cancel_event = _run_cancel.get()
+        for attempt in range(max_retries + 1):
+            if cancel_event is not None and cancel_event.is_set():
+                raise InterruptedError("Model call was cancelled")
+            waiting = time.monotonic()
+            self.rate_limiter.acquire(estimate_tokens(prompt))
+            tracing.current_span().add('throttled_seconds', round(time.monotonic() - waiting, 3))
             try:
-                def _analyze():
-                    if self._stop_event.is_set():
-                        raise InterruptedError("Analysis was interrupted")
-                    
-                    prompt = PROMPTS['html_analysis'].format(
-                        url=url,
-                        target_description=target_description,
-                        html=html[:5000]  # Limiting content size for better performance
-                    )
-                    
-                    response = self.api_handler.send_message(prompt)
-                    if response:
-                        return extract_python_code(response)
-                    return None
-
-                result = self._execute_with_timeout(_analyze)
-                if result:
-                    analysis_results[url] = result
-                else:
-                    handle_error(f"Gemini API analysis failed for {url}.")
-                    analysis_results[url] = None
-
-            except TimeoutError:
-                handle_error(f"HTML analysis timed out for {url}")
-                analysis_results[url] = None
-            except Exception as e:
-                handle_error(f"An error occurred during Gemini API analysis for {url}: {e}")
-                analysis_results[url] = None
-
-        return analysis_results
-
-    def generate_code(self, analysis_results):
-        """Sends HTML analysis to Gemini API for code generation with timeout."""
-        if not self.api_handler.chat_session:
-            handle_error("Chat session not initialized.")
+                response = call()
+            except QuotaExceededError as e:
+                tracing.current_span().add('retries')
+                delay = self.rate_limiter.backoff()
+                handle_error(f"Gemini quota exceeded{f' for {label}' if label else ''}, "
+                             f"backing off {delay:.1f}s (attempt {attempt + 1}/{max_retries + 1}): {e}")
+                continue
+            self.rate_limiter.record_success()
+            return response
+        return None
+
+    def prepare_html(self, url, html):
+        """Reduces a page to its DOM skeleton within the prompt budget and records the savings."""
+        reduced, report = reduce_html(html)
+        reduced = reduced[:REDUCER_CONFIG['max_prompt_chars']]
+        report['prompt_chars'] = len(reduced)
+        self.reduction_reports[url] = report
+        logging.info(
+            f"Reduced HTML for {url}: {report['original_chars']} -> {report['reduced_chars']} chars "
+            f"({report['compression_ratio']:.1f}x, ~{report['estimated_tokens_saved']} tokens saved)"
+        )
+        return reduced
+
+    def analyze_html(self, html_content, target_description, on_chunk=None):
+        """Sends HTML and target description to Gemini API for analysis with timeout.
+
+        With on_chunk, each response is streamed and on_chunk(url, text_so_far) is called as it arrives.
+        """
+        if not self.api_handler.is_ready():
+            handle_error("Gemini model not initialized.")
             return None
 
+        self._scale_rate_limiter()
+        pages = {url: self.prepare_html(url, html) for url, html in html_content.items()}
+        return self.analyze_reduced(pages, target_description, on_chunk)
+
+    def analyze_reduced(self, pages, target_description, on_chunk=None):
+        """Analyzes {url: reduced_html} pages already passed through prepare_html.
+
+        Returns {url: analysis}, None for pages whose analysis failed. A
+        streaming pipeline calls it page by page within one run.
+        """
+        if not self.api_handler.is_ready():
+            handle_error("Gemini model not initialized.")
+            return None
+
+        if len(pages) == 1:
+            url, reduced = next(iter(pages.items()))
+            return {url: self._analyze_reduced(url, reduced, target_description, on_chunk)}
+        # URLs are analyzed concurrently; the shared rate limiter keeps us within quota
+        with ThreadPoolExecutor(max_workers=RATE_LIMIT_CONFIG['analysis_concurrency']) as executor:
+            if self.batch_analysis:
+                results = self._analyze_batched(executor, pages, target_description, on_chunk)
+            else:
+                futures = {
+                    url: executor.submit(tracing.wrap(self._analyze_reduced), url, reduced, target_description, on_chunk)
+                    for url, reduced in pages.items()
+                }
+                results = {url: future.result() for url, future in futures.items()}
+        return {url: results.get(url) for url in pages}
+
+    def _analyze_batched(self, executor, pages, target_description, on_chunk=None):
+        """Analyzes reduced pages packed into batched prompts, retrying pages an answer left out on their own."""
+        batches = pack_batches(pages)
+        logging.info(f"Packed {len(pages)} pages into {len(batches)} analysis requests")
+        results = {}
+        futures = [
+            executor.submit(tracing.wrap(self._analyze_batch), batch, target_description, on_chunk)
+            for batch in batches
+        ]
+        for future in futures:
+            results.update(future.result())
+
+        missing = [url for url in pages if not results.get(url)]
+        if missing:
+            logging.info(f"Batched analysis left out {len(missing)} pages, analyzing them one by one")
+            retries = {
+                url: executor.submit(tracing.wrap(self._analyze_reduced), url, pages[url], target_description, on_chunk)
+                for url in missing
+            }
+            results.update({url: future.result() for url, future in retries.items()})
+        return results
+
+    def _analyze_batch(self, batch, target_description, on_chunk=None):
+        """Analyzes one batch of (url, reduced_html) pages with a single request.
+
+        Returns {url: analysis} for the pages the answer covered.
+        """
+        if len(batch) == 1:
+            url, reduced = batch[0]
+            return {url: self._analyze_reduced(url, reduced, target_description, on_chunk)}
+
+        urls = [url for url, _ in batch]
+        label = f"batch of {len(batch)} pages"
+
+        def on_batch_chunk(text):
+            for url, section in split_batch_sections(text, urls).items():
+                on_chunk(url, section)
+
         try:
-            def _generate():
-                if self._stop_event.is_set():
-                    raise InterruptedError("Code generation was interrupted")
-                
-                prompt = PROMPTS['code_generation'].format(
-                    analysis_results=analysis_results
+            response = self._send_prompt(
+                'html_batch_analysis',
+                label=label,
+                on_chunk=on_batch_chunk if on_chunk else None,
+                complete=True,
+                target_description=target_description,
+                pages="\n\n".join(
+                    f"{BATCH_SECTION_MARKER.format(url=url)}\n{reduced}" for url, reduced in batch
                 )
-                
-                response = self.api_handler.send_message(prompt)
-                if response:
-                    return extract_python_code(response)
-                return None
+            )
+            if not response:
+                handle_error(f"Gemini API analysis failed for {label}.")
+                return {}
+            return {
+                url: extract_python_code(section)
+                for url, section in split_batch_sections(response, urls).items()
+                if section
+            }
+        except TimeoutError:
+            handle_error(f"HTML analysis timed out for {label}")
+        except Exception as e:
+            handle_error(f"An error occurred during Gemini API analysis for {label}: {e}")
+        return {}
+
+    def _analyze_reduced(self, url, reduced, target_description, on_chunk=None):
+        """Analyzes a single page already passed through prepare_html. Returns the analysis, or None on failure."""
+        try:
+            response = self._send_prompt(
+                'html_analysis',
+                label=url,
+                on_chunk=(lambda text: on_chunk(url, text)) if on_chunk else None,
+                url=url,
+                target_description=target_description,
+                html=reduced
+            )
+            result = extract_python_code(response) if response else None
+            if result:
+                return result
+            handle_error(f"Gemini API analysis failed for {url}.")
+        except TimeoutError:
+            handle_error(f"HTML analysis timed out for {url}")
+        except Exception as e:
+            handle_error(f"An error occurred during Gemini API analysis for {url}: {e}")
+        return None
 
-            generated_code = self._execute_with_timeout(_generate)
+    def generate_code(self, analysis_results, on_chunk=None):
+        """Sends HTML analysis to Gemini API for code generation with timeout.
+
+        With on_chunk, the response is streamed and on_chunk(text_so_far) is called
+        as it arrives. The code is returned as soon as its block is complete.
+        """
+        if not self.api_handler.is_ready():
+            handle_error("Gemini model not initialized.")
+            return None
+
+        self.rate_limiter.scale(self.api_handler.key_count())
+        try:
+            response = self._send_prompt(
+                'code_generation',
+                on_chunk=on_chunk,
+                analysis_results=analysis_results
+            )
+            generated_code = extract_python_code(response) if response else None
             if not generated_code:
                 handle_error("Gemini API code generation failed.")
                 return None
@@ -97,4 +421,44 @@ class GeminiAPIHandler:
             return None
         except Exception as e:
             handle_error(f"An error occurred during Gemini API code generation: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def generate_spec(self, html_content, target_description, on_chunk=None):
+        """Asks Gemini for a declarative extraction spec instead of scraper code.
+
+        The spec is derived from the first page and meant to hold for every page
+        sharing its layout. Returns the validated spec dict, or None on failure.
+        With on_chunk, the response is streamed and on_chunk(text_so_far) is called.
+        """
+        if not self.api_handler.is_ready():
+            handle_error("Gemini model not initialized.")
+            return None
+        if not html_content:
+            handle_error("No HTML content to derive an extraction spec from.")
+            return None
+
+        self._scale_rate_limiter()
+        url, html = next(iter(html_content.items()))
+        try:
+            response = self._send_prompt(
+                'selector_spec',
+                label=url,
+                on_chunk=on_chunk,
+                complete=True,
+                url=url,
+                target_description=target_description,
+                html=self.prepare_html(url, html)
+            )
+            if not response:
+                handle_error("Gemini API extraction spec generation failed.")
+                return None
+            return parse_spec(response)
+        except SpecError as e:
+            handle_error(f"Gemini returned an unusable extraction spec: {e}")
+            return None
+        except TimeoutError:
+            handle_error(f"Extraction spec generation timed out after {self.timeout} seconds")
+            return None
+        except Exception as e:
+            handle_error(f"An error occurred during Gemini API extraction spec generation: {e}")
+            return None
@@ -1,7 +1,10 @@
 import requests
+import asyncio
 import json
+import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from http_client import get_client
 
 # URLs for HTTP proxy lists
 PROXY_SOURCES = [
@@ -17,6 +20,10 @@ TIMEOUT = 0.5  # 0.5 seconds
 MAX_RETRIES = 5  # Retry up to 5 times
 RETRY_DELAY = 0.1  # 0.1 seconds delay between retries
 
+# Async tester settings
+TARGET_COUNT = 5  # Stop probing once this many proxies work
+MAX_CONCURRENT_PROBES = 1000  # Open sockets at once, keep below the file descriptor limit
+
 def fetch_proxies(url):
     """
     Fetches proxies from a given URL.
@@ -28,7 +35,7 @@ def fetch_proxies(url):
         list: A list of proxy addresses.
     """
     try:
-        response = requests.get(url, timeout=10)
+        response = get_client().get(url, timeout=10)
         response.raise_for_status()
         proxies = response.text.splitlines()
         return proxies
@@ -56,7 +63,7 @@ def test_proxy(proxy, timeout=TIMEOUT, max_retries=MAX_RETRIES):
     retries = 0
     while retries < max_retries:
         try:
-            response = requests.get(TEST_URL, proxies=proxy_dict, timeout=timeout)
+            response = get_client().get(TEST_URL, proxies=proxy_dict, timeout=timeout)
             if response.status_code == 200:
                 print(f"Proxy {proxy} is working.")
                 return True
@@ -80,15 +87,134 @@ def test_proxy(proxy, timeout=TIMEOUT, max_retries=MAX_RETRIES):
     print(f"Proxy {proxy} failed after {max_retries} retries.")
     return False
 
-def save_proxies_to_json(proxies, output_path="proxy.json"):
+async def probe_proxy(proxy, timeout=TIMEOUT, max_retries=MAX_RETRIES):
+    """
+    Asynchronously tests an HTTP proxy by sending a request for TEST_URL through it.
+    
+    Uses a raw asyncio connection so thousands of probes can be in flight
+    without a thread per proxy.
+    
+    Args:
+        proxy (str): The proxy address in the format "ip:port".
+        timeout (float): Timeout for connecting and for the response status line.
+        max_retries (int): Maximum number of attempts.
+    
+    Returns:
+        float: Latency in seconds of the first successful attempt, or None if the proxy failed.
+    """
+    host, _, port = proxy.rpartition(':')
+    if not host or not port.isdigit():
+        return None
+
+    target = urlsplit(TEST_URL)
+    request = (
+        f"GET {TEST_URL} HTTP/1.1\r\n"
+        f"Host: {target.netloc}\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode()
+
+    loop = asyncio.get_running_loop()
+    for _ in range(max_retries):
+        start = loop.time()
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, int(port)), timeout)
+            writer.write(request)
+            await writer.drain()
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+            parts = status_line.split()
+            if len(parts) >= 2 and parts[1] == b"200":
+                return loop.time() - start
+        except (OSError, asyncio.TimeoutError, ValueError):
+            pass
+        finally:
+            if writer is not None:
+                writer.close()
+        await asyncio.sleep(RETRY_DELAY)
+
+    return None
+
+async def fetch_all_proxies(sources=PROXY_SOURCES):
+    """
+    Fetches every proxy source concurrently and merges the results.
+    
+    Args:
+        sources (list): URLs of proxy lists.
+    
+    Returns:
+        list: Unique, non-empty proxy addresses in first-seen order.
+    """
+    results = await asyncio.gather(*(asyncio.to_thread(fetch_proxies, url) for url in sources))
+    for url, proxies in zip(sources, results):
+        print(f"Fetched {len(proxies)} proxies from: {url}")
+    return list(dict.fromkeys(proxy.strip() for proxies in results for proxy in proxies if proxy.strip()))
+
+async def probe_proxies(proxies, max_concurrency=MAX_CONCURRENT_PROBES):
+    """
+    Probes proxies concurrently, yielding (proxy, latency_seconds_or_None) as each probe finishes.
+    
+    Closing the generator cancels every probe still in flight.
+    
+    Args:
+        proxies (list): Proxy addresses in the format "ip:port".
+        max_concurrency (int): Maximum number of probes in flight.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _probe(proxy):
+        async with semaphore:
+            return proxy, await probe_proxy(proxy)
+
+    tasks = [asyncio.create_task(_probe(proxy)) for proxy in proxies]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def find_working_proxies(proxies, target_count=TARGET_COUNT, max_concurrency=MAX_CONCURRENT_PROBES):
+    """
+    Probes proxies concurrently and stops as soon as enough of them work.
+    
+    Outstanding probes are cancelled once target_count proxies have succeeded.
+    
+    Args:
+        proxies (list): Proxy addresses in the format "ip:port".
+        target_count (int): Number of working proxies to find.
+        max_concurrency (int): Maximum number of probes in flight.
+    
+    Returns:
+        list: (proxy, latency_seconds) tuples sorted fastest first.
+    """
+    working = []
+    results = probe_proxies(proxies, max_concurrency)
+    try:
+        async for proxy, latency in results:
+            if latency is None:
+                continue
+            print(f"Proxy {proxy} is working ({latency * 1000:.0f} ms).")
+            working.append((proxy, latency))
+            if len(working) >= target_count:
+                break
+    finally:
+        await results.aclose()
+
+    return sorted(working, key=lambda item: item[1])
+
+def save_proxies_to_json(proxies, output_path="proxy.json", latencies=None):
     """
     Saves the list of proxies to a JSON file in the required format.
     
     Args:
         proxies (list): A list of proxy addresses.
         output_path (str): Path to save the JSON file. Default is "proxy.json".
+        latencies (dict, optional): Measured latency in seconds per proxy address.
     """
     proxy_data = {"proxies": proxies}
+    if latencies:
+        proxy_data["latency_ms"] = {proxy: round(latencies[proxy] * 1000) for proxy in proxies if proxy in latencies}
     try:
         with open(output_path, 'w') as json_file:
             json.dump(proxy_data, json_file, indent=4)
@@ -96,35 +222,36 @@ def save_proxies_to_json(proxies, output_path="proxy.json"):
     except Exception as e:
         print(f"Error saving JSON file: {e}")
 
-def main():
-    working_proxies = []
-
-    # Fetch and test HTTP proxies from the provided URLs
-    for url in PROXY_SOURCES:
-        print(f"Fetching proxies from: {url}")
-        proxies = fetch_proxies(url)
+async def run(full=False):
+    """
+    Refreshes the persistent proxy store and writes the fastest working proxies to proxy.json.
+    
+    Only new or stale proxies are probed unless full is True, in which case
+    every fetched proxy is probed from scratch as before.
+    """
+    if full:
+        proxies = await fetch_all_proxies()
         if not proxies:
-            print(f"No proxies found in {url}")
-            continue
-
-        # Use ThreadPoolExecutor to test proxies concurrently
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = {executor.submit(test_proxy, proxy): proxy for proxy in proxies}
-            for future in as_completed(futures):
-                proxy = futures[future]
-                if future.result():
-                    working_proxies.append(f"http://{proxy}")
-                    if len(working_proxies) >= 5:
-                        break  # Stop after finding 5 working proxies
-
-        if len(working_proxies) >= 5:
-            break  # Stop after finding 5 working proxies
-
-    # Save the working proxies to a JSON file
-    if working_proxies:
-        save_proxies_to_json(working_proxies[:5])  # Save only the first 5 working proxies
-    else:
-        print("No working proxies found.")
+            print("No proxies found.")
+            return
+        print(f"Testing {len(proxies)} unique proxies...")
+        working = await find_working_proxies(proxies)
+        if working:
+            working_proxies = [f"http://{proxy}" for proxy, _ in working]
+            latencies = {f"http://{proxy}": latency for proxy, latency in working}
+            save_proxies_to_json(working_proxies, latencies=latencies)
+        else:
+            print("No working proxies found.")
+        return
 
+    # Imported here because proxy_store builds on the probing helpers above
+    from proxy_store import ProxyStore
+    store = ProxyStore()
+    probed = await store.refresh()
+    print(f"Probed {probed} proxies.")
+    store.export_json()
+
+def main():
+    asyncio.run(run(full="--full" in sys.argv[1:]))
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,24 +1,54 @@
-from utils import handle_error, make_request
+import tracing
+from utils import handle_error
+from fetch_engine import AsyncFetchEngine
 
 class HTMLFetcher:
-    def __init__(self, url_handler):
+    def __init__(self, url_handler, engine=None, urls=None):
         self.url_handler = url_handler
+        self.engine = engine or AsyncFetchEngine()
+        # A job fetches the URLs it was started with, even if the handler's list changes meanwhile
+        self.urls = urls
+
+    def _urls(self):
+        return self.urls if self.urls is not None else self.url_handler.urls
+
+    def fetch_page(self, url):
+        """Returns the HTML of one URL, reusing the page kept from validation if there is one.
+
+        Returns None when the page can't be fetched.
+        """
+        response = self.url_handler.take_response(url)
+        if response is not None:
+            tracing.current_span().set(source='validation', bytes=len(response.content))
+            return response.text
+        result = self.engine.fetch_one(url)
+        if result.ok:
+            return result.response.text
+        handle_error(f"Failed to fetch HTML from {url} with both direct and proxy connections: {result.error}")
+        return None
+
+    def iter_html(self):
+        """Yields (url, html) pairs as soon as each concurrent fetch completes.
+
+        Pages already downloaded during URL validation are yielded first and
+        are not fetched again.
+        """
+        pending = []
+        for url in self._urls():
+            response = self.url_handler.take_response(url)
+            if response is not None:
+                yield url, response.text
+            else:
+                pending.append(url)
+
+        for result in self.engine.iter_fetch(pending):
+            if result.ok:
+                yield result.url, result.response.text
+            else:
+                handle_error(f"Failed to fetch HTML from {result.url} with both direct and proxy connections: {result.error}")
 
     def fetch_html(self):
         """Fetches HTML content from the validated URLs with proxy fallback."""
-        html_content = {}
-        for url in self.url_handler.urls:
-            # First try without proxy
-            response = make_request(url, use_proxy=False)
-            
-            # If failed, try with proxy
-            if not response:
-                handle_error(f"Direct connection failed for {url}, attempting with proxy...")
-                response = make_request(url, use_proxy=True)
-            
-            if response:
-                html_content[url] = response.text
-            else:
-                handle_error(f"Failed to fetch HTML from {url} with both direct and proxy connections")
-        
-        return html_content
\ No newline at end of file
+        fetched = dict(self.iter_html())
+        # Keep the caller's URL order regardless of completion order
+        return {url: fetched[url] for url in self._urls() if url in fetched}
@@ -0,0 +1,179 @@
+import re
+from html import escape
+from html.parser import HTMLParser
+from config import REDUCER_CONFIG
+
+# Elements whose content never holds target data
+SKIPPED_TAGS = {'script', 'style', 'svg', 'noscript', 'template', 'link'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+             'param', 'source', 'track', 'wbr'}
+# Attributes that only carry presentation or behaviour
+DROPPED_ATTRIBUTE_PREFIXES = ('on', 'style')
+
+# Rough chars-per-token ratio for HTML, good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+class Node:
+    __slots__ = ('tag', 'attrs', 'children', '_signature')
+
+    def __init__(self, tag, attrs=None):
+        self.tag = tag
+        self.attrs = attrs or []
+        self.children = []
+        self._signature = None
+
+    def signature(self):
+        """Structural identity: tag, classes and the children's structure, ignoring text."""
+        if self._signature is None:
+            classes = ' '.join(sorted((dict(self.attrs).get('class') or '').split()))
+            child_signatures = ','.join(child.signature() if isinstance(child, Node) else '#'
+                                        for child in self.children)
+            self._signature = f"{self.tag}.{classes}({child_signatures})"
+        return self._signature
+
+class RepeatMarker:
+    """Stands in for the siblings collapsed into the preceding sample."""
+    __slots__ = ('count', 'tag')
+
+    def __init__(self, count, tag):
+        self.count = count
+        self.tag = tag
+
+    def __str__(self):
+        return f"<!-- {self.count} more similar <{self.tag}> -->"
+
+class _TreeBuilder(HTMLParser):
+    """Builds a light element tree, dropping skipped elements and comments."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node('#root')
+        self.stack = [self.root]
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.skip_depth:
+            if tag in SKIPPED_TAGS and tag not in VOID_TAGS:
+                self.skip_depth += 1
+            return
+        if tag in SKIPPED_TAGS:
+            if tag not in VOID_TAGS:
+                self.skip_depth = 1
+            return
+        node = Node(tag, attrs)
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.skip_depth or tag in SKIPPED_TAGS:
+            return
+        self.stack[-1].children.append(Node(tag, attrs))
+
+    def handle_endtag(self, tag):
+        if self.skip_depth:
+            if tag in SKIPPED_TAGS:
+                self.skip_depth -= 1
+            return
+        # Close up to the matching open element, tolerating unclosed children
+        for index in range(len(self.stack) - 1, 0, -1):
+            if self.stack[index].tag == tag:
+                del self.stack[index:]
+                return
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        text = re.sub(r'\s+', ' ', data)
+        if text.strip():
+            self.stack[-1].children.append(text)
+
+def build_tree(html):
+    """Parses html into a light Node tree without scripts, styles or comments. Returns the root."""
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+class HTMLReducer:
+    """Shrinks a page to its DOM skeleton so a whole page fits the analysis prompt.
+
+    Scripts, styles, SVG and comments are removed. Runs of structurally
+    identical siblings collapse to one sample plus a count. Long attribute
+    values and text are shortened.
+    """
+    def __init__(self, max_attribute_length=None, max_text_length=None):
+        self.max_attribute_length = max_attribute_length or REDUCER_CONFIG['max_attribute_length']
+        self.max_text_length = max_text_length or REDUCER_CONFIG['max_text_length']
+
+    def _shorten(self, value, limit):
+        return value if len(value) <= limit else value[:limit] + '…'
+
+    def _collapse(self, children):
+        """Replaces runs of identical sibling elements with the first one and a count."""
+        collapsed = []
+        index = 0
+        while index < len(children):
+            child = children[index]
+            if not isinstance(child, Node):
+                collapsed.append(child)
+                index += 1
+                continue
+            run_end = index + 1
+            while run_end < len(children):
+                sibling = children[run_end]
+                if isinstance(sibling, Node) and sibling.signature() == child.signature():
+                    run_end += 1
+                elif isinstance(sibling, str) and not sibling.strip():
+                    run_end += 1
+                else:
+                    break
+            repeats = sum(1 for sibling in children[index + 1:run_end] if isinstance(sibling, Node))
+            collapsed.append(child)
+            if repeats:
+                collapsed.append(RepeatMarker(repeats, child.tag))
+            index = run_end
+        return collapsed
+
+    def _serialize(self, node, parts):
+        for child in self._collapse(node.children):
+            if isinstance(child, RepeatMarker):
+                parts.append(str(child))
+                continue
+            if isinstance(child, str):
+                parts.append(escape(self._shorten(child, self.max_text_length), quote=False))
+                continue
+            attrs = ''.join(
+                f' {name}="{escape(self._shorten(value, self.max_attribute_length))}"' if value is not None else f' {name}'
+                for name, value in child.attrs
+                if not name.startswith(DROPPED_ATTRIBUTE_PREFIXES)
+            )
+            parts.append(f"<{child.tag}{attrs}>")
+            if child.tag not in VOID_TAGS:
+                self._serialize(child, parts)
+                parts.append(f"</{child.tag}>")
+
+    def reduce(self, html):
+        """Reduces html and reports how much smaller it got.
+
+        Returns:
+            tuple: (reduced_html, report) where report holds original_chars,
+            reduced_chars, compression_ratio and estimated_tokens_saved.
+        """
+        parts = []
+        self._serialize(build_tree(html), parts)
+        reduced = ''.join(parts)
+        report = {
+            'original_chars': len(html),
+            'reduced_chars': len(reduced),
+            'compression_ratio': len(html) / max(len(reduced), 1),
+            'estimated_tokens_saved': max(len(html) - len(reduced), 0) // CHARS_PER_TOKEN,
+        }
+        return reduced, report
+
+def reduce_html(html):
+    """Reduces html with the configured limits. Returns (reduced_html, report)."""
+    return HTMLReducer().reduce(html)
+
+def estimate_tokens(text):
+    """Approximates the token count of text for prompt budgeting."""
+    return len(text) // CHARS_PER_TOKEN
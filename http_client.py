@@ -0,0 +1,177 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from config import HTTP_CONFIG
+
+class ConnectionStats:
+    """Thread-safe counters for requests sent vs. TCP/TLS connections opened."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.http2_requests = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.new_connections += 1
+
+    def record_http2_request(self):
+        with self._lock:
+            self.http2_requests += 1
+
+    def snapshot(self):
+        """Returns the current counters as a dict."""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'new_connections': self.new_connections,
+                'reused_connections': max(self.requests - self.new_connections, 0),
+                'http2_requests': self.http2_requests,
+            }
+
+def _counting_pool_classes(stats):
+    """Builds connection pool classes that report every socket they (re)connect to stats.
+
+    Counting in connect() rather than when a pool creates a connection object
+    also catches keep-alive connections that the server dropped and urllib3 reopened.
+    """
+    class CountingHTTPConnection(HTTPConnection):
+        def connect(self):
+            stats.record_new_connection()
+            return super().connect()
+
+    class CountingHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            stats.record_new_connection()
+            return super().connect()
+
+    class CountingHTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = CountingHTTPConnection
+
+    class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = CountingHTTPSConnection
+
+    return {'http': CountingHTTPConnectionPool, 'https': CountingHTTPSConnectionPool}
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose per-host pools (direct and proxied) count connection reuse."""
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        self._pool_classes = _counting_pool_classes(stats)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._pool_classes
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if hasattr(manager, 'pool_classes_by_scheme'):
+            manager.pool_classes_by_scheme = self._pool_classes
+        return manager
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        return super().send(request, **kwargs)
+
+class HTTPClient:
+    """Process-wide HTTP client with per-host keep-alive pools and compressed transfer.
+
+    Direct requests can optionally go over HTTP/2 when httpx[http2] is installed.
+    Every method returns a requests.Response so callers don't care which transport was used.
+    """
+    def __init__(self, config=None):
+        self.config = config or HTTP_CONFIG
+        self.stats = ConnectionStats()
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': self.config['user_agent'],
+            'Accept-Encoding': DEFAULT_ACCEPT_ENCODING,
+            'DNT': '1',
+            'Connection': 'keep-alive'
+        })
+        adapter = PooledHTTPAdapter(
+            self.stats,
+            pool_connections=self.config['pool_connections'],
+            pool_maxsize=self.config['pool_maxsize']
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._http2_client = self._create_http2_client() if self.config.get('http2') else None
+
+    def _create_http2_client(self):
+        """Creates an HTTP/2 capable httpx client, or None if httpx[http2] is unavailable."""
+        try:
+            import httpx
+            import h2  # noqa: F401  (httpx needs it for http2=True)
+        except ImportError:
+            return None
+        limits = httpx.Limits(
+            max_connections=self.config['pool_connections'] * self.config['pool_maxsize'],
+            max_keepalive_connections=self.config['pool_maxsize']
+        )
+        return httpx.Client(http2=True, limits=limits, headers=dict(self.session.headers),
+                            follow_redirects=True)
+
+    def _request_http2(self, method, url, timeout=None, headers=None, allow_redirects=True):
+        """Sends a direct request over httpx and converts the result to a requests.Response."""
+        import httpx
+        try:
+            result = self._http2_client.request(method, url, timeout=timeout, headers=headers,
+                                                follow_redirects=allow_redirects)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except httpx.HTTPError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+
+        self.stats.record_request()
+        if result.http_version == 'HTTP/2':
+            self.stats.record_http2_request()
+
+        response = requests.Response()
+        response.status_code = result.status_code
+        response.reason = result.reason_phrase
+        response.headers = CaseInsensitiveDict(result.headers)
+        response.url = str(result.url)
+        response.encoding = result.encoding
+        response._content = result.content
+        return response
+
+    def request(self, method, url, proxies=None, timeout=10, headers=None, allow_redirects=True, **kwargs):
+        """Sends a request through the shared pools."""
+        if self._http2_client is not None and not proxies and not kwargs:
+            return self._request_http2(method, url, timeout=timeout, headers=headers,
+                                       allow_redirects=allow_redirects)
+        return self.session.request(method, url, proxies=proxies, timeout=timeout, headers=headers,
+                                    allow_redirects=allow_redirects, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Returns the process-wide HTTPClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HTTPClient()
+    return _client
+
+def get_connection_stats():
+    """Returns request vs. new/reused connection counters for the shared client."""
+    return get_client().stats.snapshot()
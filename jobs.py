@@ -0,0 +1,174 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config import JOBS_CONFIG
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+# Id of the job the current thread or task is working for; stage and pool threads
+# inherit it through tracing.wrap
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+class JobQueueFullError(Exception):
+    """Raised when a job is submitted while the scheduler's queue is full."""
+
+class Workspace:
+    """Directory holding everything a single scrape job writes: code, raw output, artifacts and logs."""
+    def __init__(self, root, job_id):
+        self.path = os.path.abspath(os.path.join(root, job_id))
+        os.makedirs(self.path, exist_ok=True)
+        self.code_file = self.file('scraper.py')
+        self.output_file = self.file('scraped_data.txt')
+        self.snapshot_dir = self.file('snapshot')
+        self.output_doc = self.file('output.docx')
+        self.log_file = self.file('job.log')
+        self.trace_file = self.file('trace.jsonl')
+        self.trace_summary_file = self.file('trace_summary.txt')
+
+    def file(self, name):
+        """Absolute path of a file inside the workspace."""
+        return os.path.join(self.path, name)
+
+class Job:
+    """One scrape run: its inputs, workspace and outcome."""
+    def __init__(self, urls, target_description, workspace_root=None):
+        self.id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+        self.urls = list(urls)
+        self.target_description = target_description
+        self.workspace = Workspace(workspace_root or JOBS_CONFIG['workspace_root'], self.id)
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        # Per-operation timing rows, see tracing.Tracer.summary_rows
+        self.trace_summary = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        # Set by cancel(); the pipeline's stages and model calls watch it
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Asks the job to stop: a queued job never starts, a running one stops after its current step."""
+        self.cancel_event.set()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'urls': self.urls,
+            'workspace': self.workspace.path,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+class JobLogHandler(logging.FileHandler):
+    """Copies log records emitted while working for a job into the job's workspace log.
+
+    Records are matched by the job id in the logging thread's context, so lines
+    from the job's stage threads and thread pools end up in its log as well.
+    INFO and above are kept whatever level the console shows.
+    """
+    def __init__(self, job):
+        super().__init__(job.workspace.log_file, mode='a', encoding='utf-8')
+        self.job_id = job.id
+        self.setLevel(logging.INFO)
+        self.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    def filter(self, record):
+        return _current_job.get() == self.job_id and super().filter(record)
+
+class JobScheduler:
+    """Runs scrape jobs on a bounded pool of threads.
+
+    At most `max_concurrent_jobs` run at once. Up to `max_pending_jobs` more may
+    wait; submitting beyond that raises JobQueueFullError. Only the latest
+    `keep_finished_jobs` finished jobs stay in `jobs`, so a long session doesn't
+    hold on to every result; callers keep the Job objects they still need.
+    """
+    def __init__(self, max_concurrent_jobs=None, max_pending_jobs=None, keep_finished_jobs=None):
+        self.max_concurrent_jobs = max_concurrent_jobs or JOBS_CONFIG['max_concurrent_jobs']
+        self.max_pending_jobs = max_pending_jobs or JOBS_CONFIG['max_pending_jobs']
+        self.keep_finished_jobs = (JOBS_CONFIG['keep_finished_jobs']
+                                   if keep_finished_jobs is None else keep_finished_jobs)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_jobs, thread_name_prefix='scrape-job')
+        self._lock = threading.Lock()
+        self.jobs = {}
+
+    def submit(self, job, run):
+        """Queues job; run(job) does the work and its return value becomes job.result."""
+        with self._lock:
+            pending = sum(1 for queued in self.jobs.values() if queued.status == QUEUED)
+            if pending >= self.max_pending_jobs:
+                raise JobQueueFullError(f"{pending} jobs are already waiting, try again later")
+            self.jobs[job.id] = job
+        job.future = self._executor.submit(self._run, job, run)
+        return job
+
+    def cancel(self, job_id):
+        """Cancels a queued or running job. Returns False when there is no such active job."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None or job.status not in (QUEUED, RUNNING):
+            return False
+        job.cancel()
+        return True
+
+    def cancel_all(self):
+        """Cancels every queued and running job. Returns how many were cancelled."""
+        jobs = self.active()
+        for job in jobs:
+            job.cancel()
+        return len(jobs)
+
+    def _run(self, job, run):
+        token = _current_job.set(job.id)
+        handler = JobLogHandler(job)
+        logging.getLogger().addHandler(handler)
+        job.started_at = time.time()
+        try:
+            if job.cancel_event.is_set():
+                raise InterruptedError("Scraping job was cancelled before it started")
+            job.status = RUNNING
+            job.result = run(job)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            # Whatever a cancelled run raised on its way out, it ends as cancelled
+            job.status = CANCELLED if job.cancel_event.is_set() else FAILED
+        finally:
+            job.finished_at = time.time()
+            logging.getLogger().removeHandler(handler)
+            handler.close()
+            _current_job.reset(token)
+            self._prune()
+        return job
+
+    def _prune(self):
+        """Forgets the oldest finished jobs beyond keep_finished_jobs."""
+        with self._lock:
+            finished = sorted(
+                (job for job in self.jobs.values() if job.status in (DONE, FAILED, CANCELLED)),
+                key=lambda job: job.finished_at
+            )
+            for job in finished[:max(0, len(finished) - self.keep_finished_jobs)]:
+                del self.jobs[job.id]
+
+    def active(self):
+        """Jobs that are queued or running."""
+        with self._lock:
+            return [job for job in self.jobs.values() if job.status in (QUEUED, RUNNING)]
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from config import LLM_CACHE_CONFIG
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+'''
+
+class LLMCache:
+    """Persistent cache of model responses keyed by everything that determines them.
+
+    The key covers the model name, its generation_config, the prompt template and
+    the values filled into it. Least recently used entries are evicted once the
+    cache exceeds max_entries or max_bytes.
+    """
+    def __init__(self, path=None, max_entries=None, max_bytes=None):
+        self.path = path or LLM_CACHE_CONFIG['path']
+        self.max_entries = max_entries or LLM_CACHE_CONFIG['max_entries']
+        self.max_bytes = max_bytes or LLM_CACHE_CONFIG['max_bytes']
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def make_key(self, model, generation_config, template, inputs):
+        """Hashes the model, its generation_config, the prompt template and its inputs."""
+        payload = json.dumps({
+            'model': model,
+            'generation_config': generation_config,
+            'template': template,
+            'inputs': inputs,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """Returns the cached response text for key, or None."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row:
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                self.stats['hits'] += 1
+                return row[0]
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, model, response):
+        """Stores a response and evicts old entries if the cache is over its bounds."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode()), now, now)
+            )
+            self.stats['stores'] += 1
+            self._evict(conn)
+
+    def _evict(self, conn):
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.stats['evictions'] += 1
+            count -= 1
+            total -= size
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_llm_cache():
+    """Returns the process-wide LLMCache, or None when it is disabled."""
+    global _cache
+    if not LLM_CACHE_CONFIG['enabled']:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
@@ -1,4 +1,3 @@
-import customtkinter as ctk
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 import logging
@@ -6,12 +5,14 @@ from datetime import datetime
 from api_handler import APIHandler
 from url_handler import URLHandler
 from target_parser import TargetParser
-from html_fetcher import HTMLFetcher
 from gemini_api_handler import GeminiAPIHandler
-from code_executor import CodeExecutor
-from output_formatter import OutputFormatter
 from utils import handle_error
-from save_to_word import save_response_to_word
+from proxy_pool import get_proxy_pool
+from proxy_store import ProxyStore
+from worker_pool import get_worker_pool
+from jobs import Job, JobScheduler, JobQueueFullError
+from pipeline import ScrapePipeline
+from config import PROXY_CONFIG
 import platform
 import subprocess
 import os
@@ -54,13 +55,35 @@ class ModernWebScraperApp:
         self.api_handler = APIHandler()
         self.url_handler = URLHandler()
         self.target_parser = TargetParser()
-        self.html_fetcher = HTMLFetcher(self.url_handler)
         self.gemini_api_handler = GeminiAPIHandler(self.api_handler)
-        self.code_executor = CodeExecutor()
-        self.output_formatter = OutputFormatter()
+
+        # Scrape jobs run concurrently, each in its own workspace
+        self.scheduler = JobScheduler()
+        self.pipeline = ScrapePipeline(
+            self.url_handler, self.gemini_api_handler,
+            on_progress=lambda job, value, status_text: self.safe_update_progress(value, f"[{job.id}] {status_text}"),
+            on_output=lambda job, text: self.safe_update_output(text)
+        )
+        self.last_output_doc = None
+
+        # Start the scraper workers now so they are warm by the first run
+        get_worker_pool()
+
+        # Keep the proxy store and proxy.json fresh while the app runs
+        self.proxy_store = None
+        if PROXY_CONFIG['background_refresh']:
+            self.proxy_store = ProxyStore()
+            self.proxy_store.start_background_refresh(on_update=self._on_proxies_refreshed)
 
         # Initialize queue for thread-safe GUI updates
         self.update_queue = queue.Queue()
+
+        # URL validation state, only touched on the GUI thread
+        self.url_valid = False
+        self.url_validation_running = False
+        self.url_check_counts = {'done': 0, 'valid': 0, 'total': 0}
+        # URLs of the current validation that have not resolved yet
+        self.url_pending = []
         
         self.create_gui()
         self.setup_logging()
@@ -69,6 +92,13 @@ class ModernWebScraperApp:
         # Start the GUI update checker
         self.check_queue()
 
+    def _on_proxies_refreshed(self, proxies):
+        """Adds proxies found by a background refresh to the live proxy pool."""
+        pool = get_proxy_pool()
+        for proxy in proxies:
+            pool.add(proxy)
+        logging.info(f"Proxy store refreshed: {len(proxies)} working proxies")
+
     def setup_logging(self):
         """Set up logging configuration."""
         root_logger = logging.getLogger()
@@ -164,6 +194,14 @@ class ModernWebScraperApp:
         )
         self.start_button.pack(side=RIGHT)
 
+        self.stop_button = ttk.Button(
+            button_frame,
+            text="Stop Jobs",
+            command=self.stop_scraping,
+            bootstyle="outline-danger"
+        )
+        self.stop_button.pack(side=RIGHT, padx=(0, 10))
+
         # Output Tab
         output_frame = ttk.Frame(self.notebook, padding=10)
         self.notebook.add(output_frame, text="Output")
@@ -268,7 +306,11 @@ class ModernWebScraperApp:
         self.check_start_button_state()
 
     def validate_urls(self):
-        """Validates the entered URLs."""
+        """Validates the entered URLs on a background thread."""
+        if self.url_validation_running:
+            return
+
+        self.url_valid = False
         urls_text = self.url_entry.get().strip()
         if not urls_text:
             self.url_status_label.configure(text="URL required", bootstyle="danger")
@@ -282,20 +324,68 @@ class ModernWebScraperApp:
             return
             
         self.url_handler.urls = []  # Reset URLs
-        self.url_status_label.configure(text="Validating...", bootstyle="warning")
-        self.window.update()  # Update UI immediately
-        
-        try:
-            for url in urls:
-                self.url_handler.add_url(url)
+        for url in urls:
+            self.url_handler.add_url(url)
+
+        self.url_validation_running = True
+        self.url_check_counts = {'done': 0, 'valid': 0, 'total': len(urls)}
+        self.url_pending = list(urls)
+        self.url_status_label.configure(text=f"Validating 0/{len(urls)}...", bootstyle="warning")
+        self.validate_url_button.configure(state="disabled")
+        self.check_start_button_state()
 
-            if self.url_handler.validate_urls():
-                self.url_status_label.configure(text="Valid ✓", bootstyle="success")
-            else:
-                self.url_status_label.configure(text="Invalid URLs", bootstyle="danger")
+        validation_thread = threading.Thread(target=self.url_validation_worker)
+        validation_thread.daemon = True
+        validation_thread.start()
+
+    def url_validation_worker(self):
+        """Worker function that validates URLs and streams each result to the GUI."""
+        def on_result(url, is_valid, message):
+            self.update_queue.put((self._on_url_validated, (url, is_valid, message)))
+
+        try:
+            any_valid = self.url_handler.validate_urls(on_result=on_result)
+            self.update_queue.put((self._finish_url_validation, (any_valid, None)))
         except Exception as e:
-            self.url_status_label.configure(text=f"Error: {str(e)}", bootstyle="danger")
-        
+            self.update_queue.put((self._finish_url_validation, (False, str(e))))
+
+    def _on_url_validated(self, url, is_valid, message):
+        """Records one URL's validation result; runs on the GUI thread."""
+        counts = self.url_check_counts
+        counts['done'] += 1
+        if url in self.url_pending:
+            self.url_pending.remove(url)
+        if is_valid:
+            counts['valid'] += 1
+            logging.info(f"URL valid: {url}")
+
+        if counts['valid'] and not self.url_valid:
+            # The first valid URL is enough to start scraping
+            self.url_valid = True
+            self.check_start_button_state()
+
+        self.url_status_label.configure(
+            text=f"Validating {counts['done']}/{counts['total']} ({counts['valid']} valid)...",
+            bootstyle="success" if counts['valid'] else "warning"
+        )
+
+    def _finish_url_validation(self, any_valid, error):
+        """Shows the final validation outcome; runs on the GUI thread."""
+        self.url_validation_running = False
+        self.validate_url_button.configure(state="normal")
+        counts = self.url_check_counts
+        if error:
+            self.url_valid = False
+            self.url_status_label.configure(text=f"Error: {error}", bootstyle="danger")
+        elif any_valid:
+            self.url_valid = True
+            text = "Valid ✓"
+            if counts['valid'] < counts['total']:
+                text = f"Valid ✓ ({counts['valid']}/{counts['total']})"
+            self.url_status_label.configure(text=text, bootstyle="success")
+        else:
+            self.url_valid = False
+            self.url_status_label.configure(text="Invalid URLs", bootstyle="danger")
         self.check_start_button_state()
     def check_start_button_state(self):
         """Enables the Start button if all required fields are valid."""
@@ -305,7 +395,7 @@ class ModernWebScraperApp:
         
         # Get current validation states
         api_valid = self.api_status_label.cget("text") == "Valid ✓"
-        url_valid = self.url_status_label.cget("text") == "Valid ✓"
+        url_valid = self.url_valid
         
         # Check all conditions
         if all([
@@ -356,110 +446,58 @@ class ModernWebScraperApp:
         """Thread-safe method to update button state."""
         self.update_queue.put((button.configure, {"state": state}))
 
-    def scraping_worker(self):
-        """Worker function to run the scraping process in a separate thread."""
-        try:
-            logging.info("Starting scraping process")
-            
-            # Get and set target description
-            target_description = self.target_entry.get("1.0", "end-1c").strip()
-            self.target_parser.set_target_description(target_description)
-            logging.info(f"Target description set: {target_description[:50]}...")
-
-            # Step 1: Fetch HTML
-            self.safe_update_progress(10, "Fetching HTML...")
-            logging.info("Fetching HTML content...")
-            html_content = self.html_fetcher.fetch_html()
-            logging.info("HTML content fetched successfully")
-            self.safe_update_progress(20, "HTML fetched successfully")
-
-            # Step 2: Analyze HTML
-            self.safe_update_progress(30, "Analyzing HTML with Gemini API...")
-            logging.info("Starting HTML analysis with Gemini API...")
-            try:
-                analysis_results = self.gemini_api_handler.analyze_html(html_content, target_description)
-                logging.info("HTML analysis completed successfully")
-                self.safe_update_progress(40, "HTML analysis complete")
-            except TimeoutError:
-                logging.error("HTML analysis timed out")
-                raise Exception("HTML analysis took too long to complete. Please try again or simplify your target description.")
-            except Exception as e:
-                logging.error(f"HTML analysis failed: {str(e)}")
-                raise Exception(f"HTML analysis failed: {str(e)}")
-            
-            # Step 3: Generate code
-            self.safe_update_progress(50, "Generating code with Gemini API...")
-            logging.info("Generating code with Gemini API...")
-            try:
-                generated_code = self.gemini_api_handler.generate_code(analysis_results)
-                logging.info("Code generation completed successfully")
-                self.safe_update_progress(60, "Code generation complete")
-            except TimeoutError:
-                logging.error("Code generation timed out")
-                raise Exception("Code generation took too long to complete. Please try again.")
-            except Exception as e:
-                logging.error(f"Code generation failed: {str(e)}")
-                raise Exception(f"Code generation failed: {str(e)}")
-            
-            if generated_code:
-                # Step 4: Save and execute code
-                self.safe_update_progress(70, "Executing generated code...")
-                logging.info("Saving and executing generated code...")
-                
-                if self.code_executor.save_code(generated_code):
-                    scraped_data = self.code_executor.execute_code()
-                    logging.info("Code executed successfully")
-
-                    if scraped_data:
-                        self.safe_update_progress(80, "Formatting output...")
-                        logging.info("Formatting and saving output...")
-                        
-                        if self.output_formatter.format_and_save_output(scraped_data):
-                            # Step 5: Save final output to Word document
-                            self.safe_update_progress(90, "Saving output to Word document...")
-                            logging.info("Saving response to Word document...")
-                            output_file = save_response_to_word(scraped_data)
-                            logging.info("Response saved to Word document")
-                            
-                            self.safe_update_progress(100, "Scraping complete! ✓")
-                            self.safe_update_output(scraped_data)
-                            self.safe_update_button_state(self.open_output_button, "normal")
-                            logging.info("Scraping process completed successfully")
-                        else:
-                            raise Exception("Error formatting output")
-                    else:
-                        raise Exception("Error executing code")
-                else:
-                    raise Exception("Error saving code")
-            else:
-                raise Exception("Error generating code")
-                
-        except Exception as e:
-            logging.error(f"Scraping process failed: {str(e)}")
-            self.safe_update_progress(0, f"Error: {str(e)}")
+    def scraping_worker(self, job):
+        """Runs one scrape job on a scheduler thread and shows its result."""
+        scraped_data = self.pipeline.run(job)
+        self.update_queue.put((self._set_last_output, (job.workspace.output_doc,)))
+        return scraped_data
+
+    def _set_last_output(self, output_doc):
+        """Points the Open Output File button at the latest finished job; runs on the GUI thread."""
+        self.last_output_doc = output_doc
+        self.open_output_button.configure(state="normal")
 
     def start_scraping(self):
-        """Starts the web scraping process in a separate thread."""
+        """Queues a scrape job for the current URLs and target on the job scheduler."""
+        # Read the inputs here, on the GUI thread; the job keeps its own copy
+        target_description = self.target_entry.get("1.0", "end-1c").strip()
+        self.target_parser.set_target_description(target_description)
+        job = Job(self.url_handler.urls, target_description)
+        # Starting before validation finished: URLs still being checked are not part of this job
+        left_out = [url for url in self.url_pending if url not in job.urls] if self.url_validation_running else []
+
         # Switch to output tab
         self.notebook.select(1)
-        
+
+        try:
+            self.scheduler.submit(job, self.scraping_worker)
+        except JobQueueFullError as e:
+            self.safe_update_progress(0, f"Error: {str(e)}")
+            return
+
+        if left_out:
+            logging.warning(f"Job {job.id} started before validation finished, leaving out {len(left_out)} "
+                            f"URLs still being checked: {', '.join(left_out)}")
+
         # Reset progress
-        self.safe_update_progress(0, "Starting scraping process...")
-        
-        # Start the scraping process in a separate thread
-        threading_thread = threading.Thread(target=self.scraping_worker)
-        threading_thread.daemon = True
-        threading_thread.start()
+        running = len(self.scheduler.active())
+        self.safe_update_progress(0, f"[{job.id}] Starting scraping process..." + (f" ({running} jobs active)" if running > 1 else "")
+                                  + (f" ({len(left_out)} URLs still validating left out, see log)" if left_out else ""))
+
+    def stop_scraping(self):
+        """Cancels every queued and running scrape job; running ones stop after their current step."""
+        cancelled = self.scheduler.cancel_all()
+        self.safe_update_progress(0, f"Stopping {cancelled} jobs..." if cancelled else "No jobs running")
 
     def open_output_file(self):
         """Opens the output Word document."""
         try:
             if platform.system() == "Windows":
-                os.startfile(self.output_formatter.output_doc)
+                os.startfile(self.last_output_doc)
             elif platform.system() == "Darwin":  # macOS
-                subprocess.Popen(["open", self.output_formatter.output_doc])
+                subprocess.Popen(["open", self.last_output_doc])
             else:  # Linux
-                subprocess.Popen(["xdg-open", self.output_formatter.output_doc])
+                subprocess.Popen(["xdg-open", self.last_output_doc])
         except Exception as e:
             handle_error(f"Failed to open output file: {e}")
             self.status_label.configure(
@@ -0,0 +1,146 @@
+import threading
+import time
+from rate_limiter import TokenBucket
+from config import AI_CONFIG, ROUTING_CONFIG
+
+class AllRoutesExhaustedError(Exception):
+    """Raised when every key/model route for a stage is cooling down after quota errors."""
+
+class KeyState:
+    """Per-key quota buckets, usage counters and per-model exhaustion windows."""
+    def __init__(self, index, api_key, requests_per_minute, tokens_per_minute):
+        self.index = index
+        self.api_key = api_key
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        # model name -> monotonic time until which the model is not tried on this key
+        self.exhausted_until = {}
+        self.calls = 0
+        self.tokens_sent = 0
+        self.quota_errors = 0
+
+    def wait_time(self, model, tokens, now):
+        """Seconds until this key may send `tokens` tokens to model, None while the model is exhausted."""
+        if self.exhausted_until.get(model, 0.0) > now:
+            return None
+        return max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+
+    def to_dict(self):
+        return {
+            'key': mask_key(self.api_key),
+            'calls': self.calls,
+            'tokens_sent': self.tokens_sent,
+            'quota_errors': self.quota_errors,
+            'exhausted_models': sorted(
+                model for model, until in self.exhausted_until.items() if until > time.monotonic()
+            ),
+        }
+
+class Route:
+    """One (key, model) choice handed out by ModelRouter.acquire."""
+    def __init__(self, key_state, stage, model, generation_config):
+        self.key_state = key_state
+        self.stage = stage
+        self.model = model
+        self.generation_config = generation_config
+
+    @property
+    def api_key(self):
+        return self.key_state.api_key
+
+    def __repr__(self):
+        return f"Route({self.stage}, {self.model}, key #{self.key_state.index})"
+
+def mask_key(api_key):
+    """Shows only the last four characters of an API key for logs and stats."""
+    return f"...{api_key[-4:]}" if api_key else ''
+
+class ModelRouter:
+    """Spreads model calls over a pool of API keys and picks a model tier per call.
+
+    Each stage has an ordered list of tiers in ROUTING_CONFIG['tiers']. A tier
+    with `max_input_tokens` is only used for prompts up to that size, so small
+    pages go to a fast model and large ones to a bigger one. Within a tier the
+    key that can send soonest under its own request/token quota is chosen.
+    A quota error marks that model as exhausted on that key for `key_cooldown`
+    seconds and the next call falls through to another key or the next tier.
+    When every route is benched, acquire() waits for the first one to come back.
+    """
+    def __init__(self, api_keys, config=None):
+        self.config = config or ROUTING_CONFIG
+        self._lock = threading.Lock()
+        self.keys = [
+            KeyState(index, api_key,
+                     self.config['key_requests_per_minute'],
+                     self.config['key_tokens_per_minute'])
+            for index, api_key in enumerate(dict.fromkeys(api_keys))
+        ]
+
+    def tiers(self, stage, tokens=0):
+        """Returns the stage's tiers that accept a prompt of `tokens` tokens, in preference order."""
+        tiers = self.config['tiers'].get(stage) or [{'model': AI_CONFIG[stage]['model']}]
+        eligible = [
+            tier for tier in tiers
+            if tier.get('max_input_tokens') is None or tokens <= tier['max_input_tokens']
+        ]
+        # A prompt too large for every tier still goes to the largest one
+        return eligible or tiers[-1:]
+
+    def generation_config(self, stage, tier):
+        return tier.get('generation_config') or AI_CONFIG[stage]['generation_config']
+
+    def preferred_model(self, stage, tokens=0):
+        """The model a prompt of this size is routed to when no key is exhausted."""
+        return self.tiers(stage, tokens)[0]['model']
+
+    def acquire(self, stage, tokens=0, exclude=(), deadline=None):
+        """Blocks until some key may send this prompt and returns its Route.
+
+        Routes in `exclude` (e.g. ones that already failed for this call) are skipped.
+        While every other route is cooling down it waits for the first to come
+        back, unless that is past `deadline` (a time.monotonic() value); then,
+        or when nothing but excluded routes is left, it raises AllRoutesExhaustedError.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                best = None
+                benched_until = None
+                for tier in self.tiers(stage, tokens):
+                    for key_state in self.keys:
+                        if (key_state.index, tier['model']) in exclude:
+                            continue
+                        wait = key_state.wait_time(tier['model'], tokens, now)
+                        if wait is None:
+                            until = key_state.exhausted_until[tier['model']]
+                            benched_until = until if benched_until is None else min(benched_until, until)
+                        elif best is None or wait < best[0]:
+                            best = (wait, key_state, tier)
+                    # Stay on the preferred tier while any of its keys has quota left
+                    if best is not None:
+                        break
+                if best is None:
+                    if benched_until is None or (deadline is not None and benched_until > deadline):
+                        raise AllRoutesExhaustedError(f"All API keys and models for {stage} are exhausted")
+                    wait = benched_until - now
+                    key_state = None
+                else:
+                    wait, key_state, tier = best
+                if key_state is not None and wait <= 0:
+                    key_state.requests.consume(1)
+                    key_state.tokens.consume(tokens)
+                    key_state.calls += 1
+                    key_state.tokens_sent += tokens
+                    return Route(key_state, stage, tier['model'], self.generation_config(stage, tier))
+            time.sleep(min(wait, 1.0))
+
+    def mark_exhausted(self, route):
+        """Benches the route's model on its key after a quota error."""
+        with self._lock:
+            route.key_state.quota_errors += 1
+            route.key_state.exhausted_until[route.model] = time.monotonic() + self.config['key_cooldown']
+
+    def stats(self):
+        """Returns per-key call, token and quota-error counters."""
+        with self._lock:
+            return [key_state.to_dict() for key_state in self.keys]
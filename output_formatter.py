@@ -1,9 +1,8 @@
-from docx import Document
 from utils import handle_error
 
 class OutputFormatter:
-    def __init__(self):
-        self.output_doc = "output.docx"
+    def __init__(self, output_doc=None):
+        self.output_doc = output_doc or "output.docx"
 
     def format_and_save_output(self, scraped_data):
         """Formats the scraped data and saves it to a Word document."""
@@ -12,6 +11,7 @@ class OutputFormatter:
             return False
 
         try:
+            from docx import Document
             doc = Document()
             doc.add_paragraph(scraped_data)
             doc.save(self.output_doc)
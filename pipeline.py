@@ -0,0 +1,282 @@
+import logging
+import threading
+import tracing
+from html_fetcher import HTMLFetcher
+from code_executor import CodeExecutor
+from output_formatter import OutputFormatter
+from save_to_word import save_response_to_word
+from scraper_registry import get_scraper_registry, fingerprint_html, combine_fingerprints
+from stages import Stage, StagedPipeline
+from config import PIPELINE_CONFIG, TRACING_CONFIG
+
+# Share of the progress bar taken by the stages; formatting and saving the output fill the rest
+STAGES_PROGRESS = 80
+
+class ScrapePipeline:
+    """Runs URLHandler → HTMLFetcher → GeminiAPIHandler → CodeExecutor for scrape jobs.
+
+    The steps run as overlapping stages (see stages.StagedPipeline): a page is
+    reduced and analyzed while the next one is still downloading. Has no GUI
+    dependencies. Progress and partial output are reported through
+    on_progress(job, value, status_text) and on_output(job, text), which may be
+    called from any of the job's stage threads.
+    """
+    def __init__(self, url_handler, gemini_api_handler, on_progress=None, on_output=None):
+        self.url_handler = url_handler
+        self.gemini_api_handler = gemini_api_handler
+        self.on_progress = on_progress
+        self.on_output = on_output
+
+    def _progress(self, job, value, status_text):
+        if self.on_progress:
+            self.on_progress(job, value, status_text)
+
+    def _output(self, job, text):
+        if self.on_output:
+            self.on_output(job, text)
+
+    def _stage(self, name, func, gather=False):
+        return Stage(name, func, PIPELINE_CONFIG['stage_workers'].get(name, 1), gather)
+
+    def _fetch_stage(self, job, url_handler):
+        fetcher = HTMLFetcher(url_handler, urls=job.urls)
+
+        def fetch(url):
+            html = fetcher.fetch_page(url)
+            if html is None:
+                return None
+            logging.info(f"Fetched {url}")
+            return {'url': url, 'html': html}
+
+        return self._stage('fetch', fetch)
+
+    def _in_url_order(self, job, pages):
+        """{url: page} in the order the job listed its URLs; stages finish pages in any order."""
+        by_url = {page['url']: page for page in pages}
+        if not by_url:
+            raise Exception("Failed to fetch HTML from every URL")
+        return {url: by_url[url] for url in job.urls if url in by_url}
+
+    def _analyses(self, job, pages, on_chunk=None):
+        """{url: analysis} for the pages, analyzing the ones the analyze stage skipped."""
+        skipped = {url: page['reduced'] for url, page in pages.items() if not page.get('analyzed')}
+        if skipped:
+            logging.info(f"Analyzing {len(skipped)} pages before generating code...")
+            results = self.gemini_api_handler.analyze_reduced(skipped, job.target_description, on_chunk) or {}
+            for url in skipped:
+                pages[url]['analysis'] = results.get(url)
+                pages[url]['analyzed'] = True
+        return {url: page['analysis'] for url, page in pages.items()}
+
+    def generate_scraper_code(self, job, analysis_results):
+        """Generates scraper code from the page analyses with the Gemini API."""
+        logging.info("Generating code with Gemini API...")
+        try:
+            generated_code = self.gemini_api_handler.generate_code(
+                analysis_results,
+                on_chunk=lambda text: self._output(job, f"=== Generated code ===\n{text}")
+            )
+            logging.info("Code generation completed successfully")
+        except TimeoutError:
+            logging.error("Code generation timed out")
+            raise Exception("Code generation took too long to complete. Please try again.")
+        except Exception as e:
+            logging.error(f"Code generation failed: {str(e)}")
+            raise Exception(f"Code generation failed: {str(e)}")
+
+        if not generated_code:
+            raise Exception("Error generating code")
+        return generated_code
+
+    def run_scraper(self, job, generated_code, html_content):
+        """Saves and executes scraper code on the fetched pages. Returns the scraped data, or None."""
+        logging.info("Saving and executing generated code...")
+        code_executor = CodeExecutor(job.workspace)
+        if not code_executor.save_code(generated_code):
+            raise Exception("Error saving code")
+        scraped_data = code_executor.execute_code(html_content)
+        if scraped_data:
+            logging.info("Code executed successfully")
+        return scraped_data
+
+    def code_stages(self, job, url_handler):
+        """fetch → reduce → analyze → generate (or reuse) → execute a Python scraper."""
+        gemini = self.gemini_api_handler
+        target_description = job.target_description
+        registry = get_scraper_registry()
+        probe = {'decided': False, 'reuse_likely': False}
+        probe_lock = threading.Lock()
+        partial_analyses = {}
+
+        def on_analysis_chunk(url, text):
+            # Show every URL's analysis as it streams in
+            partial_analyses[url] = text
+            self._output(job, "\n\n".join(
+                f"=== Analysis: {partial_url} ===\n{partial_text}"
+                for partial_url, partial_text in list(partial_analyses.items())
+            ))
+
+        def reuse_likely(page):
+            # Decided on the first page to arrive: when a stored scraper probably fits
+            # this layout, analysis waits until the generate stage knows for sure
+            with probe_lock:
+                if not probe['decided']:
+                    probe['decided'] = True
+                    probe['reuse_likely'] = bool(registry) and registry.has_candidate(page['fingerprint'], target_description)
+                    if probe['reuse_likely']:
+                        logging.info("Pages look like a stored scraper's, holding off analysis")
+                return probe['reuse_likely']
+
+        def reduce(page):
+            page['reduced'] = gemini.prepare_html(page['url'], page['html'])
+            page['fingerprint'] = fingerprint_html(page['html']) if registry else None
+            return page
+
+        def analyze(page):
+            if not reuse_likely(page):
+                results = gemini.analyze_reduced({page['url']: page['reduced']}, target_description, on_analysis_chunk)
+                page['analysis'] = (results or {}).get(page['url'])
+                page['analyzed'] = True
+            return page
+
+        def analyze_batch(pages):
+            # Batched prompts need every page at once, so this stage gathers them
+            if pages and not reuse_likely(pages[0]):
+                self._analyses(job, {page['url']: page for page in pages}, on_analysis_chunk)
+            return pages
+
+        def generate(pages):
+            pages = self._in_url_order(job, pages)
+            html_content = {url: page['html'] for url, page in pages.items()}
+            fingerprint = combine_fingerprints(page['fingerprint'] for page in pages.values()) if registry else None
+            # Reuse a scraper that already worked on pages with the same layout
+            reused = registry.find(html_content, target_description, fingerprint) if registry else None
+            if reused:
+                code = reused['code']
+            else:
+                code = self.generate_scraper_code(job, self._analyses(job, pages, on_analysis_chunk))
+            return {'pages': pages, 'html_content': html_content, 'fingerprint': fingerprint,
+                    'code': code, 'reused': reused}
+
+        def execute(build):
+            html_content = build['html_content']
+            scraped_data = self.run_scraper(job, build['code'], html_content)
+            if not scraped_data and build['reused']:
+                logging.info("Stored scraper failed on these pages, generating a new one")
+                registry.discard(build['reused']['id'])
+                build['reused'] = None
+                build['code'] = self.generate_scraper_code(job, self._analyses(job, build['pages'], on_analysis_chunk))
+                scraped_data = self.run_scraper(job, build['code'], html_content)
+            if scraped_data and registry and not build['reused']:
+                registry.register(html_content, target_description, build['code'], build['fingerprint'])
+            return scraped_data or None
+
+        if gemini.batch_analysis:
+            analyze_stage, generate_stage = self._stage('analyze', analyze_batch, gather=True), self._stage('generate', generate)
+        else:
+            analyze_stage, generate_stage = self._stage('analyze', analyze), self._stage('generate', generate, gather=True)
+        return [
+            self._fetch_stage(job, url_handler),
+            self._stage('reduce', reduce),
+            analyze_stage,
+            generate_stage,
+            self._stage('execute', execute),
+        ]
+
+    def spec_stages(self, job, url_handler):
+        """fetch → generate a declarative extraction spec → apply it in-process."""
+        def generate(pages):
+            html_content = {url: page['html'] for url, page in self._in_url_order(job, pages).items()}
+            logging.info("Deriving extraction spec with Gemini API...")
+            spec = self.gemini_api_handler.generate_spec(
+                html_content, job.target_description,
+                on_chunk=lambda text: self._output(job, f"=== Extraction spec ===\n{text}")
+            )
+            if not spec:
+                raise Exception("Error generating extraction spec")
+            return spec, html_content
+
+        def execute(build):
+            spec, html_content = build
+            logging.info("Applying extraction spec to fetched pages...")
+            return CodeExecutor(job.workspace).execute_spec(spec, html_content) or None
+
+        return [
+            self._fetch_stage(job, url_handler),
+            self._stage('generate', generate, gather=True),
+            self._stage('execute', execute),
+        ]
+
+    def run(self, job, url_handler=None):
+        """Runs one scrape job and returns the scraped data; every file it writes goes to the job's workspace.
+
+        url_handler supplies responses kept from URL validation. Raises on failure,
+        and InterruptedError once job.cancel() stops the run.
+        With tracing enabled, every stage and outbound call is recorded in the
+        workspace's trace.jsonl and summarized in trace_summary.txt.
+        """
+        tracer = tracing.Tracer(job.id, job.workspace.trace_file) if TRACING_CONFIG['enabled'] else None
+        try:
+            with tracing.trace_run(tracer), tracing.span('run', job=job.id, urls=len(job.urls)):
+                return self._run(job, url_handler)
+        finally:
+            if tracer:
+                self._report_trace(job, tracer)
+
+    def _report_trace(self, job, tracer):
+        """Saves and logs the run's summary table and refreshes the metrics file."""
+        job.trace_summary = tracer.summary_rows()
+        table = tracer.summary_table()
+        logging.info(f"Timings for job {job.id}:\n{table}")
+        try:
+            with open(job.workspace.trace_summary_file, 'w', encoding='utf-8') as f:
+                f.write(table + '\n')
+            tracing.get_metrics().write_prometheus(TRACING_CONFIG['metrics_file'])
+        except OSError as e:
+            logging.warning(f"Failed to write trace summary or metrics: {e}")
+
+    def _run(self, job, url_handler=None):
+        try:
+            logging.info(f"Starting scraping job {job.id} in {job.workspace.path}")
+            logging.info(f"Target description set: {job.target_description[:50]}...")
+
+            self.gemini_api_handler.start_run(job.cancel_event)
+            url_handler = url_handler or self.url_handler
+            if PIPELINE_CONFIG['mode'] == 'spec':
+                stages = self.spec_stages(job, url_handler)
+            else:
+                stages = self.code_stages(job, url_handler)
+            staged = StagedPipeline(
+                stages, PIPELINE_CONFIG['queue_size'],
+                on_progress=lambda fraction, summary: self._progress(job, int(fraction * STAGES_PROGRESS), summary),
+                cancel_event=job.cancel_event
+            )
+            # The first report comes from run(), once the stages know how many URLs there are
+            results = staged.run(job.urls)
+            if job.cancel_event.is_set():
+                raise InterruptedError("Scraping job was cancelled")
+            scraped_data = results[0] if results else None
+            if not scraped_data:
+                raise Exception("Error executing code")
+
+            self._progress(job, 85, "Formatting output...")
+            logging.info("Formatting and saving output...")
+            output_formatter = OutputFormatter(job.workspace.output_doc)
+            if not output_formatter.format_and_save_output(scraped_data):
+                raise Exception("Error formatting output")
+
+            # Save final output to Word document
+            self._progress(job, 90, "Saving output to Word document...")
+            logging.info("Saving response to Word document...")
+            output_file = save_response_to_word(scraped_data, job.workspace.file('gemini_response.docx'))
+            logging.info("Response saved to Word document")
+
+            self._progress(job, 100, "Scraping complete! ✓")
+            self._output(job, scraped_data)
+            logging.info("Scraping process completed successfully")
+            return scraped_data
+
+        except Exception as e:
+            logging.error(f"Scraping process failed: {str(e)}")
+            self._progress(job, 0, f"Error: {str(e)}")
+            raise
@@ -0,0 +1,209 @@
+import atexit
+import json
+import threading
+import time
+from config import PROXY_CONFIG
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class ProxyStats:
+    """Health record and circuit-breaker state for a single proxy."""
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency_ewma = None
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.probe_in_flight = False
+        # Stats for proxies no longer listed in proxy.json are kept but not used
+        self.active = False
+
+    def to_dict(self):
+        return {
+            'successes': self.successes,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'latency_ewma': self.latency_ewma,
+            'state': self.state,
+            'opened_at': self.opened_at,
+            'cooldown': self.cooldown,
+        }
+
+    @classmethod
+    def from_dict(cls, proxy, data):
+        stats = cls(proxy)
+        stats.successes = data.get('successes', 0)
+        stats.failures = data.get('failures', 0)
+        stats.consecutive_failures = data.get('consecutive_failures', 0)
+        stats.latency_ewma = data.get('latency_ewma')
+        stats.state = data.get('state', CLOSED)
+        stats.opened_at = data.get('opened_at', 0.0)
+        stats.cooldown = data.get('cooldown', 0.0)
+        # A probe can't survive a restart
+        if stats.state == HALF_OPEN:
+            stats.state = OPEN
+        return stats
+
+class ProxyPool:
+    """Scores proxies by success rate and EWMA latency and ejects failing ones.
+
+    A proxy's circuit opens after `failure_threshold` consecutive failures. Once
+    its cooldown has passed it goes half-open and lets a single probe through:
+    success closes the circuit, failure reopens it with a doubled cooldown.
+    """
+    def __init__(self, proxies, stats_file=None, config=None):
+        self.config = config or PROXY_CONFIG
+        self.stats_file = stats_file
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._load_stats()
+        for proxy in proxies:
+            self.add(proxy)
+
+    @classmethod
+    def from_file(cls, proxy_file=None, stats_file=None, config=None):
+        """Builds a pool from a proxy.json file, falling back to the configured default proxy."""
+        config = config or PROXY_CONFIG
+        proxies = load_proxy_file(proxy_file or config['proxy_file'])
+        if not proxies and config.get('fallback_proxy'):
+            proxies = [config['fallback_proxy']]
+        return cls(proxies, stats_file=stats_file or config['stats_file'], config=config)
+
+    def add(self, proxy):
+        """Adds a proxy to the pool, keeping any stats already recorded for it."""
+        with self._lock:
+            if proxy not in self._stats:
+                self._stats[proxy] = ProxyStats(proxy)
+            self._stats[proxy].active = True
+
+    def _is_available(self, stats, now):
+        if stats.state == OPEN and now - stats.opened_at >= stats.cooldown:
+            stats.state = HALF_OPEN
+            stats.probe_in_flight = False
+        if stats.state == HALF_OPEN:
+            return not stats.probe_in_flight
+        return stats.state == CLOSED
+
+    def score(self, stats):
+        """Higher is better: smoothed success rate per second of expected latency."""
+        success_rate = (stats.successes + 1) / (stats.successes + stats.failures + 2)
+        latency = stats.latency_ewma if stats.latency_ewma is not None else self.config['initial_latency']
+        return success_rate / max(latency, 0.001)
+
+    def ranked(self, limit=None):
+        """Returns proxies whose circuit allows a request, best score first."""
+        now = time.time()
+        with self._lock:
+            candidates = [stats for stats in self._stats.values()
+                          if stats.active and self._is_available(stats, now)]
+            candidates.sort(key=self.score, reverse=True)
+        proxies = [stats.proxy for stats in candidates]
+        return proxies[:limit] if limit else proxies
+
+    def begin(self, proxy):
+        """Claims a proxy for one request. Returns False if its circuit doesn't allow it right now."""
+        now = time.time()
+        with self._lock:
+            stats = self._stats.get(proxy)
+            if stats is None or not stats.active or not self._is_available(stats, now):
+                return False
+            if stats.state == HALF_OPEN:
+                stats.probe_in_flight = True
+            return True
+
+    def record_success(self, proxy, latency):
+        """Records a successful request and its latency in seconds."""
+        alpha = self.config['ewma_alpha']
+        with self._lock:
+            stats = self._stats.get(proxy)
+            if stats is None:
+                return
+            stats.successes += 1
+            stats.consecutive_failures = 0
+            if stats.latency_ewma is None:
+                stats.latency_ewma = latency
+            else:
+                stats.latency_ewma = alpha * latency + (1 - alpha) * stats.latency_ewma
+            stats.state = CLOSED
+            stats.cooldown = 0.0
+            stats.probe_in_flight = False
+
+    def record_failure(self, proxy):
+        """Records a failed request, opening the proxy's circuit when it keeps failing."""
+        with self._lock:
+            stats = self._stats.get(proxy)
+            if stats is None:
+                return
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            if stats.state == HALF_OPEN:
+                stats.cooldown = min(stats.cooldown * 2 or self.config['cooldown'], self.config['max_cooldown'])
+                self._open(stats)
+            elif stats.consecutive_failures >= self.config['failure_threshold']:
+                stats.cooldown = self.config['cooldown']
+                self._open(stats)
+
+    def _open(self, stats):
+        stats.state = OPEN
+        stats.opened_at = time.time()
+        stats.probe_in_flight = False
+
+    def snapshot(self):
+        """Returns {proxy: stats dict} including the current score."""
+        with self._lock:
+            return {proxy: dict(stats.to_dict(), score=self.score(stats))
+                    for proxy, stats in self._stats.items()}
+
+    def _load_stats(self):
+        if not self.stats_file:
+            return
+        try:
+            with open(self.stats_file, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for proxy, entry in data.get('proxies', {}).items():
+            self._stats[proxy] = ProxyStats.from_dict(proxy, entry)
+
+    def save(self):
+        """Persists proxy stats so the next run starts with what this one learned."""
+        if not self.stats_file:
+            return
+        with self._lock:
+            data = {'proxies': {proxy: stats.to_dict() for proxy, stats in self._stats.items()}}
+        try:
+            with open(self.stats_file, 'w') as f:
+                json.dump(data, f, indent=4)
+        except OSError as e:
+            print(f"Error saving proxy stats: {e}")
+
+def load_proxy_file(path):
+    """Reads the proxy list from a proxy.json file."""
+    try:
+        with open(path, 'r') as f:
+            proxies_data = json.load(f)
+            return proxies_data.get('proxies', [])
+    except FileNotFoundError:
+        print("Proxy file not found.")
+        return []
+    except json.JSONDecodeError:
+        print("Error decoding proxy JSON file.")
+        return []
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_proxy_pool():
+    """Returns the process-wide ProxyPool, loading proxy.json and saved stats on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProxyPool.from_file()
+                atexit.register(_pool.save)
+    return _pool
@@ -0,0 +1,157 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from generate_proxy_json import (fetch_all_proxies, probe_proxies, save_proxies_to_json,
+                                 PROXY_SOURCES, TARGET_COUNT)
+from config import PROXY_CONFIG
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS proxies (
+    address TEXT PRIMARY KEY,
+    first_seen REAL NOT NULL,
+    last_checked REAL,
+    checks INTEGER NOT NULL DEFAULT 0,
+    successes INTEGER NOT NULL DEFAULT 0,
+    health REAL NOT NULL DEFAULT 0.5,
+    latency REAL,
+    working INTEGER NOT NULL DEFAULT 0
+)
+'''
+
+class ProxyStore:
+    """Persistent SQLite record of every proxy seen, with rolling health.
+
+    Only proxies that are new or whose last check is older than `max_age`
+    are probed again, so a refresh is a delta check rather than a full sweep.
+    """
+    def __init__(self, path=None, max_age=None, health_alpha=0.3):
+        self.path = path or PROXY_CONFIG['store_file']
+        self.max_age = max_age or PROXY_CONFIG['max_age']
+        self.health_alpha = health_alpha
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+        self._stop_event = threading.Event()
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    def _connect(self):
+        # A connection per operation keeps the store usable from the refresh thread
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add_candidates(self, addresses):
+        """Inserts proxies not seen before. Returns how many were new."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO proxies (address, first_seen) VALUES (?, ?)",
+                [(address, now) for address in addresses]
+            )
+            return conn.total_changes - before
+
+    def due_for_check(self):
+        """Returns proxies that were never checked or are stale, known-healthy ones first."""
+        cutoff = time.time() - self.max_age
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT address FROM proxies WHERE last_checked IS NULL OR last_checked < ? "
+                "ORDER BY health DESC, latency IS NULL, latency ASC, first_seen ASC",
+                (cutoff,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def record_result(self, address, latency):
+        """Records one probe result; latency is None when the probe failed."""
+        success = 1 if latency is not None else 0
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE proxies SET last_checked = ?, checks = checks + 1, successes = successes + ?, "
+                "health = ? * ? + (1 - ?) * health, latency = COALESCE(?, latency), working = ? "
+                "WHERE address = ?",
+                (time.time(), success, self.health_alpha, success, self.health_alpha,
+                 latency, success, address)
+            )
+
+    def fresh_working(self, limit=None):
+        """Returns (address, latency) for working proxies checked within max_age, fastest first."""
+        cutoff = time.time() - self.max_age
+        query = ("SELECT address, latency FROM proxies WHERE working = 1 AND last_checked >= ? "
+                 "ORDER BY latency ASC, health DESC")
+        params = (cutoff,)
+        if limit:
+            query += " LIMIT ?"
+            params += (limit,)
+        with self._lock, self._connect() as conn:
+            return conn.execute(query, params).fetchall()
+
+    async def refresh(self, sources=PROXY_SOURCES, target_count=TARGET_COUNT):
+        """Fetches the proxy sources and re-probes only new or stale proxies.
+
+        Probing stops as soon as the store holds target_count fresh working
+        proxies; anything not probed stays due for the next refresh.
+
+        Returns:
+            int: Number of proxies probed.
+        """
+        new_count = self.add_candidates(await fetch_all_proxies(sources))
+        due = self.due_for_check()
+        fresh = len(self.fresh_working())
+        print(f"{new_count} new proxies, {len(due)} due for a check, {fresh} fresh working.")
+        if fresh >= target_count or not due:
+            return 0
+
+        probed = 0
+        results = probe_proxies(due)
+        try:
+            async for address, latency in results:
+                self.record_result(address, latency)
+                probed += 1
+                if latency is not None:
+                    print(f"Proxy {address} is working ({latency * 1000:.0f} ms).")
+                    fresh += 1
+                    if fresh >= target_count:
+                        break
+        finally:
+            await results.aclose()
+        return probed
+
+    def export_json(self, output_path="proxy.json", limit=TARGET_COUNT):
+        """Writes the fastest fresh working proxies in the usual proxy.json format."""
+        working = self.fresh_working(limit=limit)
+        if not working:
+            print("No working proxies found.")
+            return []
+        proxies = [f"http://{address}" for address, _ in working]
+        latencies = {f"http://{address}": latency for address, latency in working}
+        save_proxies_to_json(proxies, output_path=output_path, latencies=latencies)
+        return proxies
+
+    def start_background_refresh(self, interval=None, on_update=None):
+        """Refreshes the store and proxy.json periodically on a daemon thread.
+
+        Args:
+            interval (float, optional): Seconds between refreshes.
+            on_update (callable, optional): Called with the exported proxy URLs after each refresh.
+        """
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        interval = interval or PROXY_CONFIG['refresh_interval']
+        self._stop_event.clear()
+
+        def _worker():
+            while not self._stop_event.is_set():
+                try:
+                    asyncio.run(self.refresh())
+                    proxies = self.export_json()
+                    if on_update and proxies:
+                        on_update(proxies)
+                except Exception as e:
+                    print(f"Background proxy refresh failed: {e}")
+                self._stop_event.wait(interval)
+
+        self._refresh_thread = threading.Thread(target=_worker, daemon=True)
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self):
+        self._stop_event.set()
@@ -0,0 +1,88 @@
+import random
+import threading
+import time
+from config import RATE_LIMIT_CONFIG
+
+class TokenBucket:
+    """Refills `per_minute` units evenly over a minute, holding at most a minute's worth."""
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` units are available."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+    def consume(self, amount):
+        self.available -= min(amount, self.capacity)
+
+    def resize(self, per_minute):
+        """Changes the per-minute rate, keeping the units currently available."""
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.available = min(self.available, self.capacity)
+
+class RateLimiter:
+    """Limits model calls by requests per minute and tokens per minute.
+
+    Quota errors (429 / ResourceExhausted) call backoff(), which pauses every
+    caller for an exponentially growing window; successes shrink it again.
+    """
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None,
+                 initial_backoff=None, max_backoff=None):
+        self.requests_per_minute = requests_per_minute or RATE_LIMIT_CONFIG['requests_per_minute']
+        self.tokens_per_minute = tokens_per_minute or RATE_LIMIT_CONFIG['tokens_per_minute']
+        self.requests = TokenBucket(self.requests_per_minute)
+        self.tokens = TokenBucket(self.tokens_per_minute)
+        self.initial_backoff = initial_backoff or RATE_LIMIT_CONFIG['initial_backoff']
+        self.max_backoff = max_backoff or RATE_LIMIT_CONFIG['max_backoff']
+        self._backoff = 0.0
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        """Blocks until one request of `tokens` estimated tokens may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = max(
+                    self._blocked_until - now,
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(tokens, now)
+                )
+                if wait <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+                    return
+            time.sleep(min(wait, 1.0))
+
+    def scale(self, factor):
+        """Multiplies the configured quotas, e.g. by the number of API keys in use."""
+        factor = max(1, factor)
+        with self._lock:
+            self.requests.resize(self.requests_per_minute * factor)
+            self.tokens.resize(self.tokens_per_minute * factor)
+
+    def backoff(self):
+        """Pauses all callers after a quota error, doubling the pause each time."""
+        with self._lock:
+            self._backoff = min(self._backoff * 2 or self.initial_backoff, self.max_backoff)
+            # Jitter so concurrent workers don't all retry at the same instant
+            delay = self._backoff * (0.5 + random.random() / 2)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            return delay
+
+    def record_success(self):
+        """Shrinks the backoff window after a successful call."""
+        with self._lock:
+            self._backoff = self._backoff / 2 if self._backoff > self.initial_backoff else 0.0
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from config import CACHE_CONFIG
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    body_hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    stored_at REAL NOT NULL,
+    last_access REAL NOT NULL
+)
+'''
+
+# The cached body is stored decoded, so these no longer describe it
+DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+class CacheStats:
+    """Thread-safe hit/miss counters for the response cache."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stores': 0,
+                       'evictions': 0, 'bytes_saved': 0}
+
+    def add(self, name, amount=1):
+        with self._lock:
+            self.counts[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+class ResponseCache:
+    """Content-addressed on-disk cache for fetched pages.
+
+    Entries are keyed by URL plus the request headers that change the content.
+    Bodies are stored once per content hash. Stale entries are revalidated with
+    If-None-Match / If-Modified-Since. The least recently used entries are evicted
+    once the stored bodies exceed max_bytes.
+    """
+    def __init__(self, directory=None, ttl=None, max_bytes=None, vary_headers=None):
+        self.directory = directory or CACHE_CONFIG['directory']
+        self.ttl = CACHE_CONFIG['ttl'] if ttl is None else ttl
+        self.max_bytes = max_bytes or CACHE_CONFIG['max_bytes']
+        self.vary_headers = vary_headers or CACHE_CONFIG['vary_headers']
+        self.objects_dir = os.path.join(self.directory, 'objects')
+        self.index_path = os.path.join(self.directory, 'index.db')
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(self.objects_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.index_path, timeout=30)
+
+    def make_key(self, url, headers=None):
+        """Builds the cache key from the URL and the content-relevant request headers."""
+        headers = CaseInsensitiveDict(headers or {})
+        relevant = [f"{name.lower()}={headers.get(name, '')}" for name in self.vary_headers]
+        return hashlib.sha256('\n'.join([url] + relevant).encode()).hexdigest()
+
+    def _object_path(self, body_hash):
+        return os.path.join(self.objects_dir, body_hash[:2], body_hash)
+
+    def _lookup(self, key):
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT url, body_hash, size, status, headers, etag, last_modified, stored_at "
+                "FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        if not row:
+            return None
+        entry = dict(zip(('url', 'body_hash', 'size', 'status', 'headers', 'etag',
+                          'last_modified', 'stored_at'), row))
+        try:
+            with open(self._object_path(entry['body_hash']), 'rb') as f:
+                entry['body'] = f.read()
+        except FileNotFoundError:
+            return None
+        return entry
+
+    def _to_response(self, entry):
+        """Rebuilds a requests.Response from a cache entry."""
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict(json.loads(entry['headers']))
+        response.url = entry['url']
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry['body']
+        response.from_cache = True
+        return response
+
+    def _is_cacheable(self, response):
+        cache_control = response.headers.get('Cache-Control', '').lower()
+        return response.status_code == 200 and 'no-store' not in cache_control
+
+    def store(self, key, url, response):
+        """Stores a 200 response under key. Returns True if it was stored."""
+        if not self._is_cacheable(response):
+            return False
+        body = response.content
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._object_path(body_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+
+        headers = {name: value for name, value in response.headers.items()
+                   if name.lower() not in DROPPED_HEADERS}
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, url, body_hash, size, status, headers, etag, "
+                "last_modified, stored_at, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, body_hash, len(body), response.status_code, json.dumps(headers),
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'), now, now)
+            )
+        self.stats.add('stores')
+        self._evict()
+        return True
+
+    def _touch(self, key):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE entries SET stored_at = ?, last_access = ? WHERE key = ?", (now, now, key))
+
+    def _evict(self):
+        """Drops least recently used entries until the stored bodies fit in max_bytes."""
+        removed_hashes = []
+        with self._lock, self._connect() as conn:
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM entries)"
+            ).fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for key, body_hash, size in conn.execute(
+                    "SELECT key, body_hash, size FROM entries ORDER BY last_access ASC").fetchall():
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.stats.add('evictions')
+                still_used = conn.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1",
+                                          (body_hash,)).fetchone()
+                if not still_used:
+                    removed_hashes.append(body_hash)
+                    total -= size
+                if total <= self.max_bytes:
+                    break
+        for body_hash in removed_hashes:
+            try:
+                os.remove(self._object_path(body_hash))
+            except FileNotFoundError:
+                pass
+
+    def fetch(self, url, send, headers=None):
+        """Returns a response for url, from the cache when possible.
+
+        Args:
+            url (str): The URL being requested.
+            send (callable): send(extra_headers) performs the real GET and returns
+                a requests.Response (or None on failure).
+            headers (dict, optional): Request headers that are part of the cache key.
+        """
+        key = self.make_key(url, headers)
+        entry = self._lookup(key)
+        if entry and time.time() - entry['stored_at'] < self.ttl:
+            self.stats.add('hits')
+            self.stats.add('bytes_saved', entry['size'])
+            return self._to_response(entry)
+
+        conditional = {}
+        if entry and entry['etag']:
+            conditional['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            conditional['If-Modified-Since'] = entry['last_modified']
+
+        response = send(dict(headers or {}, **conditional) if conditional else headers)
+        if response is not None and response.status_code == 304 and entry:
+            self.stats.add('revalidated')
+            self.stats.add('bytes_saved', entry['size'])
+            self._touch(key)
+            return self._to_response(entry)
+
+        self.stats.add('misses')
+        if response is not None:
+            self.store(key, url, response)
+        return response
+
+    def clear(self):
+        """Removes every cached entry and body."""
+        with self._lock, self._connect() as conn:
+            hashes = [row[0] for row in conn.execute("SELECT DISTINCT body_hash FROM entries")]
+            conn.execute("DELETE FROM entries")
+        for body_hash in hashes:
+            try:
+                os.remove(self._object_path(body_hash))
+            except FileNotFoundError:
+                pass
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Returns the process-wide ResponseCache, or None when caching is disabled."""
+    global _cache
+    if not CACHE_CONFIG['enabled']:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+def get_cache_stats():
+    """Returns hit/miss/bytes-saved counters for the shared response cache."""
+    cache = get_response_cache()
+    return cache.stats.snapshot() if cache else {}
@@ -1,6 +1,3 @@
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 import datetime
 
 def save_response_to_word(response_content, output_path=None):
@@ -11,6 +8,11 @@ def save_response_to_word(response_content, output_path=None):
 		response_content (str): The content to save
 		output_path (str, optional): Custom output path for the Word document
 	"""
+	# python-docx is only loaded once a document is actually written
+	from docx import Document
+	from docx.shared import Inches, Pt
+	from docx.enum.text import WD_ALIGN_PARAGRAPH
+
 	# Create a new Document
 	doc = Document()
 	
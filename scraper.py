@@ -1,6 +1,7 @@
 import requests
 from bs4 import BeautifulSoup
 import logging
+from scraper_runtime import get_html
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -17,13 +18,10 @@ def extract_video_data(url, num_videos=5):
         Returns an empty list if an error occurs or no videos are found.
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()  # Raise an exception for bad status codes
+        # Served from the pages the app already fetched; only downloaded if missing
+        html = get_html(url)
 
-        soup = BeautifulSoup(response.content, 'html.parser')
+        soup = BeautifulSoup(html, 'html.parser')
         video_renderers = soup.select('ytd-video-renderer.style-scope.ytd-item-section-renderer')[:num_videos]
 
         if not video_renderers:
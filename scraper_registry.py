@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from html_reducer import Node, build_tree
+from config import REGISTRY_CONFIG
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scrapers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    target_hash TEXT NOT NULL,
+    target_description TEXT NOT NULL,
+    urls TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    code TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0
+)
+'''
+INDEX = "CREATE INDEX IF NOT EXISTS scrapers_target ON scrapers (target_hash)"
+
+# Only the innermost elements of a path matter; wrappers near <html> vary between pages
+PATH_DEPTH = 4
+
+def _element_paths(node, ancestors, paths):
+    """Appends the tag path (tag plus first class, innermost PATH_DEPTH levels) of every element in document order."""
+    for child in node.children:
+        if not isinstance(child, Node):
+            continue
+        classes = (dict(child.attrs).get('class') or '').split()
+        step = f"{child.tag}.{classes[0]}" if classes else child.tag
+        path = ancestors[-(PATH_DEPTH - 1):] + [step]
+        paths.append('>'.join(path))
+        _element_paths(child, path, paths)
+
+def _hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+def fingerprint_html(html, shingle_size=None, sketch_size=None):
+    """Fingerprints a page's DOM structure, ignoring its text and attribute values.
+
+    Consecutive element tag paths are grouped into shingles of shingle_size and
+    hashed. The sketch_size smallest hashes are kept (a bottom-k sketch), so
+    pages of any size get a bounded fingerprint. Returns a sorted list of ints.
+    """
+    shingle_size = shingle_size or REGISTRY_CONFIG['shingle_size']
+    sketch_size = sketch_size or REGISTRY_CONFIG['sketch_size']
+    paths = []
+    _element_paths(build_tree(html), [], paths)
+    shingles = {
+        _hash('|'.join(paths[index:index + shingle_size]))
+        for index in range(max(len(paths) - shingle_size + 1, 1))
+    } if paths else set()
+    return sorted(shingles)[:sketch_size]
+
+def combine_fingerprints(fingerprints, sketch_size=None):
+    """Merges the fingerprints of several pages into one sketch of their union."""
+    sketch_size = sketch_size or REGISTRY_CONFIG['sketch_size']
+    return sorted(set().union(*fingerprints))[:sketch_size]
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two bottom-k sketches, between 0 and 1."""
+    if not first or not second:
+        return 0.0
+    sketch_size = max(len(first), len(second))
+    union_sketch = sorted(set(first) | set(second))[:sketch_size]
+    shared = set(first) & set(second)
+    return sum(1 for value in union_sketch if value in shared) / len(union_sketch)
+
+def target_hash(target_description):
+    """Hashes a target description, ignoring case and whitespace differences."""
+    normalized = re.sub(r'\s+', ' ', target_description).strip().lower()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+def rebind_urls(code, old_urls, new_urls):
+    """Points code generated for old_urls at new_urls. Returns None when the URL lists can't be paired."""
+    if list(old_urls) == list(new_urls):
+        return code
+    if len(old_urls) != len(new_urls):
+        return None
+    # Swap through placeholders so one URL being a prefix of another can't cause double replacement
+    for index, old_url in enumerate(old_urls):
+        code = code.replace(old_url, f"\0url{index}\0")
+    for index, new_url in enumerate(new_urls):
+        code = code.replace(f"\0url{index}\0", new_url)
+    return code
+
+class ScraperRegistry:
+    """Persistent record of generated scrapers that ran successfully.
+
+    Each entry is indexed by the target description and the DOM fingerprint of
+    the pages it was generated for. find() returns a stored scraper when new
+    pages look structurally the same (similarity at or above the threshold), so
+    analysis and code generation can be skipped.
+    """
+    def __init__(self, path=None, threshold=None, max_entries=None):
+        self.path = path or REGISTRY_CONFIG['path']
+        self.threshold = threshold or REGISTRY_CONFIG['similarity_threshold']
+        self.max_entries = max_entries or REGISTRY_CONFIG['max_entries']
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'discards': 0}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+            conn.execute(INDEX)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def fingerprint(self, html_content):
+        """Combined fingerprint of {url: html} pages."""
+        return combine_fingerprints(fingerprint_html(html) for html in html_content.values())
+
+    def find(self, html_content, target_description, fingerprint=None):
+        """Returns the best stored scraper for these pages and target, or None.
+
+        The result is a dict with id, code (URLs rebound to the new pages),
+        similarity and the urls it was generated for.
+        """
+        fingerprint = fingerprint or self.fingerprint(html_content)
+        urls = list(html_content)
+        best = None
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, urls, fingerprint, code FROM scrapers WHERE target_hash = ?",
+                (target_hash(target_description),)
+            ).fetchall()
+            for entry_id, stored_urls, stored_fingerprint, code in rows:
+                score = similarity(fingerprint, json.loads(stored_fingerprint))
+                if score < self.threshold or (best and score <= best['similarity']):
+                    continue
+                rebound = rebind_urls(code, json.loads(stored_urls), urls)
+                if rebound is not None:
+                    best = {'id': entry_id, 'code': rebound, 'similarity': score, 'urls': json.loads(stored_urls)}
+            if best is None:
+                self.stats['misses'] += 1
+                return None
+            conn.execute("UPDATE scrapers SET last_used = ?, uses = uses + 1 WHERE id = ?", (time.time(), best['id']))
+            self.stats['hits'] += 1
+        logging.info(f"Reusing stored scraper #{best['id']} (structure similarity {best['similarity']:.2f})")
+        return best
+
+    def has_candidate(self, fingerprint, target_description):
+        """True if a stored scraper for this target is structurally similar to the fingerprint.
+
+        A cheap check that doesn't count as a hit or miss; find() still decides on reuse.
+        """
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT fingerprint FROM scrapers WHERE target_hash = ?",
+                (target_hash(target_description),)
+            ).fetchall()
+        return any(similarity(fingerprint, json.loads(stored)) >= self.threshold for stored, in rows)
+
+    def register(self, html_content, target_description, code, fingerprint=None):
+        """Stores a scraper that ran successfully on these pages. Returns its id."""
+        fingerprint = fingerprint or self.fingerprint(html_content)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO scrapers (target_hash, target_description, urls, fingerprint, code, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (target_hash(target_description), target_description, json.dumps(list(html_content)),
+                 json.dumps(fingerprint), code, now, now)
+            )
+            self.stats['stores'] += 1
+            # Keep only the most recently used entries
+            conn.execute(
+                "DELETE FROM scrapers WHERE id NOT IN (SELECT id FROM scrapers ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            return cursor.lastrowid
+
+    def discard(self, entry_id):
+        """Removes a stored scraper, e.g. after it failed on pages it was matched to."""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM scrapers WHERE id = ?", (entry_id,))
+            self.stats['discards'] += 1
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM scrapers")
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_scraper_registry():
+    """Returns the process-wide ScraperRegistry, or None when it is disabled."""
+    global _registry
+    if not REGISTRY_CONFIG['enabled']:
+        return None
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ScraperRegistry()
+    return _registry
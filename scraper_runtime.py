@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = 'manifest.json'
+# Set by CodeExecutor for scrapers run in a fresh interpreter
+SNAPSHOT_ENV = 'SCRAPER_SNAPSHOT_DIR'
+
+_snapshot_dir = os.environ.get(SNAPSHOT_ENV)
+_manifest = None
+stats = {'snapshot_hits': 0, 'network_fetches': 0}
+
+def snapshot_filename(url):
+    return hashlib.sha1(url.encode()).hexdigest() + '.html'
+
+def write_snapshot(directory, html_content):
+    """Writes {url: html} pages and their manifest into directory."""
+    os.makedirs(directory, exist_ok=True)
+    manifest = {}
+    for url, html in html_content.items():
+        filename = snapshot_filename(url)
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+            f.write(html)
+        manifest[url] = filename
+    with open(os.path.join(directory, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+def use_snapshot(directory):
+    """Points get_html at a snapshot directory (None for network only)."""
+    global _snapshot_dir, _manifest
+    _snapshot_dir = directory
+    _manifest = None
+    stats['snapshot_hits'] = stats['network_fetches'] = 0
+
+def _load_manifest():
+    global _manifest
+    if _manifest is None:
+        _manifest = {}
+        if _snapshot_dir:
+            try:
+                with open(os.path.join(_snapshot_dir, MANIFEST_NAME), encoding='utf-8') as f:
+                    _manifest = json.load(f)
+            except (OSError, ValueError):
+                pass
+    return _manifest
+
+def prefetched_urls():
+    """URLs whose HTML is available without a download."""
+    return list(_load_manifest())
+
+def get_html(url, timeout=10):
+    """Returns the HTML of url, from the snapshot when it was prefetched, else from the network.
+
+    Raises the HTTP client's exception when the network fallback fails.
+    """
+    filename = _load_manifest().get(url)
+    if filename:
+        with open(os.path.join(_snapshot_dir, filename), encoding='utf-8') as f:
+            stats['snapshot_hits'] += 1
+            return f.read()
+
+    # Imported only when needed so prefetched runs don't pay for the HTTP stack
+    from http_client import get_client
+    stats['network_fetches'] += 1
+    response = get_client().get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.text
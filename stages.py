@@ -0,0 +1,205 @@
+import logging
+import queue
+import threading
+import time
+import tracing
+
+# Marks the end of a stage's input
+_END = object()
+# How often blocked workers check whether the run was stopped (seconds)
+_POLL_INTERVAL = 0.1
+
+class Stage:
+    """One step of a StagedPipeline.
+
+    func(item) returns what is handed to the next stage, or None to drop the
+    item (e.g. a page that failed to download). With gather=True the stage
+    waits for everything upstream produced and calls func(items) once.
+    """
+    def __init__(self, name, func, workers=1, gather=False):
+        self.name = name
+        self.func = func
+        # A gathering stage runs once, so more workers would sit idle
+        self.workers = 1 if gather else max(1, workers or 1)
+        self.gather = gather
+
+class StagedPipeline:
+    """Runs items through stages connected by bounded queues.
+
+    Every stage has its own worker threads, so a later stage works on item N
+    while an earlier one is still busy with item N+1. A full queue blocks the
+    stage feeding it, which bounds how many items are held at once. The first
+    exception raised by a stage stops the run and is re-raised by run().
+    Setting cancel_event (e.g. a job's) or calling stop() makes every stage
+    stop after the item it is working on.
+    on_progress(fraction, summary) is called when the run starts and whenever a
+    stage finishes an item, one call at a time and in order (see progress() and
+    summary()).
+    """
+    def __init__(self, stages, queue_size=4, on_progress=None, cancel_event=None):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event
+        self.total = 0
+        self.counts = {
+            stage.name: {'received': 0, 'done': 0, 'dropped': 0, 'busy_seconds': 0.0}
+            for stage in stages
+        }
+        self._lock = threading.Lock()
+        # Serializes progress reports so they reach on_progress in the order they were taken
+        self._report_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._error = None
+
+    def run(self, items):
+        """Feeds items to the first stage and returns the list the last stage produced."""
+        items = list(items)
+        with self._lock:
+            self.total = len(items)
+        self._report()
+        queues = [queue.Queue(self.queue_size) for _ in self.stages]
+        output = queue.Queue()
+        threads = []
+        for index, stage in enumerate(self.stages):
+            outbox = queues[index + 1] if index + 1 < len(self.stages) else output
+            next_workers = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+            running = [stage.workers]
+            for number in range(stage.workers):
+                thread = threading.Thread(
+                    target=tracing.wrap(self._work), args=(stage, queues[index], outbox, running, next_workers),
+                    name=f"stage-{stage.name}-{number}", daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        for item in items:
+            if not self._put(queues[0], item):
+                break
+        for _ in range(self.stages[0].workers):
+            self._put(queues[0], _END)
+        for thread in threads:
+            thread.join()
+
+        if self._error is not None:
+            raise self._error
+        results = []
+        while not output.empty():
+            result = output.get()
+            if result is not _END:
+                results.append(result)
+        return results
+
+    def stop(self):
+        """Makes every stage stop after the item it is working on."""
+        self._stopped.set()
+
+    def stopped(self):
+        """Whether the run was stopped, cancelled or failed."""
+        return self._stopped.is_set() or (self.cancel_event is not None and self.cancel_event.is_set())
+
+    def _put(self, target, item):
+        while not self.stopped():
+            try:
+                target.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        while not self.stopped():
+            try:
+                return source.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _work(self, stage, inbox, outbox, running, next_workers):
+        try:
+            if stage.gather:
+                gathered = []
+                while (item := self._get(inbox)) is not _END:
+                    self._count(stage, 'received')
+                    gathered.append(item)
+                if not self.stopped():
+                    self._process(stage, gathered, outbox)
+            else:
+                while (item := self._get(inbox)) is not _END:
+                    self._count(stage, 'received')
+                    self._process(stage, item, outbox)
+        except Exception as e:
+            logging.error(f"Pipeline stage '{stage.name}' failed: {e}")
+            with self._lock:
+                if self._error is None:
+                    self._error = e
+            self.stop()
+        finally:
+            # The last worker of a stage tells every worker of the next one that input has ended
+            with self._lock:
+                running[0] -= 1
+                last = running[0] == 0
+            if last:
+                for _ in range(next_workers):
+                    self._put(outbox, _END)
+
+    def _process(self, stage, item, outbox):
+        start = time.monotonic()
+        with tracing.span(f"stage.{stage.name}", items=len(item) if stage.gather else 1):
+            result = stage.func(item)
+        with self._lock:
+            self.counts[stage.name]['busy_seconds'] += time.monotonic() - start
+        if result is None:
+            self._count(stage, 'dropped')
+        else:
+            self._count(stage, 'done')
+            self._put(outbox, result)
+        self._report()
+
+    def _report(self):
+        if not self.on_progress:
+            return
+        with self._report_lock:
+            with self._lock:
+                fraction, summary = self._progress(), self._summary()
+            self.on_progress(fraction, summary)
+
+    def _count(self, stage, name):
+        with self._lock:
+            self.counts[stage.name][name] += 1
+
+    def _expected(self):
+        """Items each stage will handle in total, as far as upstream drops are known."""
+        expected = {}
+        remaining = self.total
+        for stage in self.stages:
+            counts = self.counts[stage.name]
+            expected[stage.name] = 1 if stage.gather else remaining
+            remaining = expected[stage.name] - counts['dropped']
+        return expected
+
+    def progress(self):
+        """Fraction of the run's work that is finished, each stage weighing the same."""
+        with self._lock:
+            return self._progress()
+
+    def summary(self):
+        """Per-stage counts like 'fetch 3/5, analyze 1/5, generate 0/1'."""
+        with self._lock:
+            return self._summary()
+
+    def _progress(self):
+        expected = self._expected()
+        fractions = [
+            min(1.0, (self.counts[stage.name]['done'] + self.counts[stage.name]['dropped']) / expected[stage.name])
+            if expected[stage.name] else 1.0
+            for stage in self.stages
+        ]
+        return sum(fractions) / len(fractions)
+
+    def _summary(self):
+        expected = self._expected()
+        return ", ".join(
+            f"{stage.name} {self.counts[stage.name]['done'] + self.counts[stage.name]['dropped']}/{expected[stage.name]}"
+            for stage in self.stages
+        )
@@ -0,0 +1,235 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from config import TRACING_CONFIG
+
+# (tracer, span) of the operation the current thread or task is inside, if any
+_current = contextvars.ContextVar('tracing_current', default=(None, None))
+
+# Span attributes that are summed up in the summary table and the metrics file
+COUNTED_ATTRIBUTES = ('bytes', 'prompt_tokens', 'response_tokens', 'retries')
+
+class Span:
+    """One timed operation: a pipeline stage, a fetch, a proxy attempt, a model call or a scraper run."""
+    def __init__(self, name, parent=None, **attributes):
+        self.name = name
+        self.id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.id if parent else None
+        self.attributes = attributes
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, name, amount=1):
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+    def fail(self, error):
+        """Marks the operation as failed when it reports errors instead of raising them."""
+        self.error = str(error)
+
+    def end(self):
+        self.duration = time.perf_counter() - self._started
+
+    def to_dict(self):
+        return {
+            'span': self.name,
+            'id': self.id,
+            'parent': self.parent_id,
+            'start': round(self.start, 6),
+            'duration': round(self.duration, 6),
+            'error': self.error,
+            **self.attributes,
+        }
+
+class _NoopSpan:
+    """Stands in for a span when nothing is being traced, so callers never need to check."""
+    def set(self, **attributes):
+        pass
+
+    def add(self, name, amount=1):
+        pass
+
+    def fail(self, error):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Metrics:
+    """Process-wide aggregates of finished spans, exported in Prometheus text format."""
+    def __init__(self, buckets=None):
+        self.buckets = sorted(buckets or TRACING_CONFIG['duration_buckets'])
+        self._lock = threading.Lock()
+        self._spans = {}
+
+    def observe(self, span):
+        with self._lock:
+            entry = self._spans.setdefault(span.name, {
+                'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0, 'errors': 0,
+                'cache_hit': 0, 'cache_miss': 0, **{name: 0 for name in COUNTED_ATTRIBUTES},
+            })
+            index = bisect.bisect_left(self.buckets, span.duration)
+            if index < len(self.buckets):
+                entry['buckets'][index] += 1
+            entry['count'] += 1
+            entry['sum'] += span.duration
+            entry['errors'] += span.error is not None
+            if span.attributes.get('cache') in ('hit', 'miss'):
+                entry[f"cache_{span.attributes['cache']}"] += 1
+            for name in COUNTED_ATTRIBUTES:
+                entry[name] += span.attributes.get(name) or 0
+
+    def to_prometheus(self):
+        """The aggregates as a Prometheus text exposition."""
+        with self._lock:
+            spans = {name: dict(entry, buckets=list(entry['buckets'])) for name, entry in sorted(self._spans.items())}
+        lines = [
+            "# HELP scraper_span_duration_seconds Duration of traced operations.",
+            "# TYPE scraper_span_duration_seconds histogram",
+        ]
+        for name, entry in spans.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry['buckets']):
+                cumulative += count
+                lines.append(f'scraper_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'scraper_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {entry["count"]}')
+            lines.append(f'scraper_span_duration_seconds_sum{{span="{name}"}} {entry["sum"]:.6f}')
+            lines.append(f'scraper_span_duration_seconds_count{{span="{name}"}} {entry["count"]}')
+
+        counters = [
+            ('scraper_span_errors_total', "Traced operations that failed.", lambda entry: [('', entry['errors'])]),
+            ('scraper_span_bytes_total', "Bytes downloaded, sent or produced.", lambda entry: [('', entry['bytes'])]),
+            ('scraper_span_tokens_total', "Model tokens.", lambda entry: [
+                (',direction="prompt"', entry['prompt_tokens']), (',direction="response"', entry['response_tokens'])
+            ]),
+            ('scraper_span_cache_total', "Cache lookups.", lambda entry: [
+                (',result="hit"', entry['cache_hit']), (',result="miss"', entry['cache_miss'])
+            ]),
+            ('scraper_span_retries_total', "Retries after failed attempts.", lambda entry: [('', entry['retries'])]),
+        ]
+        for metric, help_text, values in counters:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for name, entry in spans.items():
+                for labels, value in values(entry):
+                    lines.append(f'{metric}{{span="{name}"{labels}}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Replaces path with the current aggregates, atomically so a scraper never reads half a file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(temporary, path)
+
+_metrics = Metrics()
+
+def get_metrics():
+    """Returns the process-wide Metrics."""
+    return _metrics
+
+class Tracer:
+    """Collects the spans of one run and appends each to a JSONL file as it finishes."""
+    def __init__(self, run_id, path=None, metrics=None):
+        self.run_id = run_id
+        self.path = path
+        self.metrics = metrics or _metrics
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def finish(self, span):
+        record = dict(span.to_dict(), run=self.run_id)
+        with self._lock:
+            self.spans.append(span)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        self.metrics.observe(span)
+
+    def summary_rows(self):
+        """Per span name: count, timings, summed counters, cache hits and misses, errors."""
+        with self._lock:
+            spans = list(self.spans)
+        by_name = {}
+        for span in spans:
+            by_name.setdefault(span.name, []).append(span)
+        rows = []
+        for name, group in sorted(by_name.items(), key=lambda item: -sum(span.duration for span in item[1])):
+            durations = sorted(span.duration for span in group)
+            row = {
+                'span': name,
+                'count': len(group),
+                'total': sum(durations),
+                'p50': statistics.median(durations),
+                'p95': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                'max': durations[-1],
+                'errors': sum(1 for span in group if span.error is not None),
+                'cache_hit': sum(1 for span in group if span.attributes.get('cache') == 'hit'),
+                'cache_miss': sum(1 for span in group if span.attributes.get('cache') == 'miss'),
+            }
+            for attribute in COUNTED_ATTRIBUTES:
+                row[attribute] = sum(span.attributes.get(attribute) or 0 for span in group)
+            rows.append(row)
+        return rows
+
+    def summary_table(self):
+        """The summary rows as a fixed-width text table, slowest operations first."""
+        header = (f"{'span':<18} {'count':>5} {'total s':>8} {'p50 s':>7} {'p95 s':>7} {'max s':>7} "
+                  f"{'bytes':>10} {'tokens in':>9} {'out':>7} {'cache':>9} {'retries':>7} {'errors':>6}")
+        lines = [header, '-' * len(header)]
+        for row in self.summary_rows():
+            cache = f"{row['cache_hit']}/{row['cache_hit'] + row['cache_miss']}" if row['cache_hit'] + row['cache_miss'] else '-'
+            lines.append(
+                f"{row['span']:<18} {row['count']:>5} {row['total']:>8.2f} {row['p50']:>7.2f} {row['p95']:>7.2f} "
+                f"{row['max']:>7.2f} {row['bytes']:>10} {row['prompt_tokens']:>9} {row['response_tokens']:>7} "
+                f"{cache:>9} {row['retries']:>7} {row['errors']:>6}"
+            )
+        return "\n".join(lines)
+
+@contextlib.contextmanager
+def trace_run(tracer):
+    """Makes tracer collect the spans opened in this context, including threads started through wrap()."""
+    token = _current.set((tracer, None))
+    try:
+        yield tracer
+    finally:
+        _current.reset(token)
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Times the enclosed block as a child of the current span; a no-op outside trace_run()."""
+    tracer, parent = _current.get()
+    if tracer is None:
+        yield NOOP_SPAN
+        return
+    current = Span(name, parent, **attributes)
+    token = _current.set((tracer, current))
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.end()
+        tracer.finish(current)
+
+def current_span():
+    """The innermost open span, or a no-op stand-in."""
+    return _current.get()[1] or NOOP_SPAN
+
+def wrap(func):
+    """Binds func to the caller's context (trace, job) before it is handed to another thread."""
+    return functools.partial(contextvars.copy_context().run, func)
@@ -1,75 +1,135 @@
 import requests
-import json
-from utils import handle_error
+import threading
+import tracing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+from utils import handle_error, request_via_proxy, cached_get
+from http_client import get_client
+from proxy_pool import get_proxy_pool
+from config import FETCH_CONFIG
 
 class URLHandler:
-    def __init__(self):
+    def __init__(self, reuse_responses=None):
         self.urls = []
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/115.0.0.0 Safari/537.36',
+        # When enabled, validation downloads the page once and keeps it for HTMLFetcher
+        self.reuse_responses = (FETCH_CONFIG['reuse_validation_response']
+                                if reuse_responses is None else reuse_responses)
+        self.responses = {}
+        self.max_workers = FETCH_CONFIG['max_concurrency']
+        self.max_per_host = FETCH_CONFIG['validation_per_host']
+        self._host_slots = {}
+        self._host_lock = threading.Lock()
+        self.client = get_client()
+        # User-Agent, compression and keep-alive come from the shared client
+        self.headers = {
             'Accept': 'application/json',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Referer': 'https://alphacoders.com/',
-            'DNT': '1',
-            'Connection': 'keep-alive'
-        })
-        self.proxies = self.load_proxies()
-
-    def load_proxies(self):
-        try:
-            with open('proxy.json', 'r') as f:
-                proxies_data = json.load(f)
-                return proxies_data.get('proxies', [])
-        except FileNotFoundError:
-            print("Proxy file not found.")
-            return []
-        except json.JSONDecodeError:
-            print("Error decoding proxy JSON file.")
-            return []
+            'Referer': 'https://alphacoders.com/'
+        }
+        self.proxy_pool = get_proxy_pool()
 
     def add_url(self, url):
         """Adds a URL to the list of URLs."""
         self.urls.append(url)
 
-    def validate_urls(self):
-        """Validates the URLs by checking for valid format and accessibility."""
+    def _request_headers(self):
+        """Headers for validation requests.
+
+        Kept responses must match what HTMLFetcher would have downloaded, so they
+        only carry the shared client's default headers.
+        """
+        return None if self.reuse_responses else self.headers
+
+    def _keep_response(self, url, response):
+        """Stores a successful validation response so the page isn't downloaded again."""
+        if response.status_code == 200:
+            self.responses[url] = response
+
+    def take_response(self, url):
+        """Returns and forgets the response kept from validation, or None."""
+        return self.responses.pop(url, None)
+
+    def _try_proxies(self, url):
+        """Retries a 403'd URL through the proxy pool, best proxies first. Returns (is_valid, message)."""
+        available = self.proxy_pool.ranked()
+        if not available:
+            return False, "No proxies available to try."
+        response = cached_get(
+            url,
+            lambda headers: request_via_proxy(url, timeout=10, max_attempts=len(available), headers=headers),
+            headers=self._request_headers()
+        )
+        if response is not None and response.status_code == 200:
+            # The proxied GET already has the body, don't throw it away
+            self._keep_response(url, response)
+            return True, "Reachable via proxy"
+        return False, f"All proxies failed to access {url}."
+
+    def validate_url(self, url):
+        """Validates a single URL. Returns (is_valid, message)."""
+        try:
+            if self.reuse_responses:
+                response = cached_get(
+                    url,
+                    lambda headers: self.client.get(url, timeout=10, headers=headers),
+                    headers=self._request_headers()
+                )
+            else:
+                response = self.client.head(url, timeout=10, headers=self.headers)
+            if response.status_code in [200, 301, 302]:
+                if self.reuse_responses:
+                    self._keep_response(url, response)
+                return True, f"Status code {response.status_code}"
+            elif response.status_code == 403:
+                return self._try_proxies(url)
+            return False, f"URL validation failed for {url}: Status code {response.status_code}"
+        except requests.exceptions.RequestException as e:
+            return False, f"URL validation failed for {url}: {str(e)}"
+
+    def _validate_bounded(self, url):
+        """Validates a URL while holding its host's slot."""
+        host = urlparse(url).netloc
+        with self._host_lock:
+            slot = self._host_slots.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        with slot:
+            return self.validate_url(url)
+
+    def validate_urls(self, on_result=None):
+        """Validates the URLs concurrently, bounded per host.
+
+        Valid URLs are published to self.urls as soon as they resolve (in the
+        original order), so callers may start working before every URL is checked.
+
+        Args:
+            on_result (callable, optional): Called as on_result(url, is_valid, message)
+                from a worker thread as each URL resolves.
+        """
         if not self.urls:
             handle_error("No URLs provided")
             return False
 
-        validated_urls = []
-        for url in self.urls:
-            try:
-                response = self.session.head(url, timeout=10)
-                if response.status_code in [200, 301, 302]:
-                    validated_urls.append(url)
-                elif response.status_code == 403:
-                    if not self.proxies:
-                        handle_error("No proxies available to try.")
-                        return False
-                    for proxy in self.proxies:
-                        try:
-                            print(f"Trying proxy: {proxy}")
-                            proxy_dict = {'http': proxy, 'https': proxy}
-                            response = self.session.get(url, proxies=proxy_dict, timeout=10)
-                            if response.status_code == 200:
-                                print(f"Proxy {proxy} succeeded.")
-                                validated_urls.append(url)
-                                break
-                            elif response.status_code == 403:
-                                print(f"Proxy {proxy} received 403.")
-                                continue
-                        except requests.exceptions.RequestException as e:
-                            print(f"Proxy {proxy} failed with error: {e}")
-                            continue
-                    if url not in validated_urls:
-                        handle_error(f"All proxies failed to access {url}.")
+        candidates = list(self.urls)
+        valid = set()
+        self.urls = []
+        self.responses = {}
+        publish_lock = threading.Lock()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(tracing.wrap(self._validate_bounded), url): url for url in candidates}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    is_valid, message = future.result()
+                except Exception as e:
+                    is_valid, message = False, f"URL validation failed for {url}: {str(e)}"
+
+                if is_valid:
+                    with publish_lock:
+                        valid.add(url)
+                        self.urls = [candidate for candidate in candidates if candidate in valid]
                 else:
-                    handle_error(f"URL validation failed for {url}: Status code {response.status_code}")
-            except requests.exceptions.RequestException as e:
-                handle_error(f"URL validation failed for {url}: {str(e)}")
-                continue
+                    handle_error(message)
+
+                if on_result:
+                    on_result(url, is_valid, message)
 
-        self.urls = validated_urls
-        return len(validated_urls) > 0
\ No newline at end of file
+        return len(valid) > 0
\ No newline at end of file
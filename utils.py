@@ -1,7 +1,13 @@
 import re
+import time
 import logging
 import requests
+import tracing
 from typing import Optional, Dict
+from http_client import get_client
+from proxy_pool import get_proxy_pool
+from response_cache import get_response_cache
+from config import PROXY_CONFIG
 
 # Configure logging
 logging.basicConfig(
@@ -10,35 +16,125 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
+# Status codes that mean the proxy itself is blocked or refusing us
+PROXY_BLOCKED_STATUS_CODES = (403, 407, 429)
+
 def get_proxies() -> Dict[str, str]:
     """
-    Returns proxy configuration. Can be extended to load from config file.
+    Returns proxy configuration for the best-scoring healthy proxy in the pool.
     """
+    ranked = get_proxy_pool().ranked(limit=1)
+    proxy = ranked[0] if ranked else PROXY_CONFIG['fallback_proxy']
     return {
-        'http': 'http://127.0.0.1:8080',
-        'https': 'http://127.0.0.1:8080'
+        'http': proxy,
+        'https': proxy
     }
 
-def make_request(url: str, use_proxy: bool = False, timeout: int = 10) -> Optional[requests.Response]:
+def request_via_proxy(url: str, timeout: int = 10, max_attempts: Optional[int] = None, **kwargs) -> Optional[requests.Response]:
+    """
+    Sends a GET through the proxy pool, trying the best-scoring proxies in turn.
+
+    Every attempt is reported back to the pool so slow or dead proxies drop in
+    the ranking and get ejected by their circuit breaker.
+
+    Args:
+        url (str): The URL to request
+        timeout (int): Request timeout in seconds per proxy attempt
+        max_attempts (int): Max proxies to try, defaults to PROXY_CONFIG['max_attempts']
+        **kwargs: Extra arguments for the HTTP client (e.g. headers)
+
+    Returns:
+        Optional[requests.Response]: The first response a proxy delivered, None if all failed
     """
-    Makes an HTTP request with optional proxy support.
+    pool = get_proxy_pool()
+    candidates = pool.ranked(limit=max_attempts or PROXY_CONFIG['max_attempts'])
+    if not candidates:
+        handle_error(f"No healthy proxies available for {url}")
+        return None
+
+    attempts = 0
+    for proxy in candidates:
+        if not pool.begin(proxy):
+            continue
+        if attempts:
+            tracing.current_span().add('retries')
+        attempts += 1
+        start = time.monotonic()
+        with tracing.span('proxy.attempt', url=url, proxy=proxy) as attempt:
+            try:
+                response = get_client().get(url, proxies={'http': proxy, 'https': proxy}, timeout=timeout, **kwargs)
+                attempt.set(status=response.status_code, bytes=len(response.content))
+            except requests.exceptions.RequestException as e:
+                pool.record_failure(proxy)
+                attempt.fail(e)
+                handle_error(f"Proxy {proxy} failed for {url}: {str(e)}")
+                continue
+            except BaseException:
+                # Anything else still ends the attempt, or a half-open probe would stay in flight forever
+                pool.record_failure(proxy)
+                raise
+
+            if response.status_code in PROXY_BLOCKED_STATUS_CODES:
+                pool.record_failure(proxy)
+                attempt.fail(f"Blocked with status {response.status_code}")
+                handle_error(f"Proxy {proxy} received {response.status_code} for {url}")
+                continue
+
+        pool.record_success(proxy, time.monotonic() - start)
+        return response
+
+    return None
+
+def cached_get(url: str, send, headers: Optional[Dict[str, str]] = None) -> Optional[requests.Response]:
+    """
+    Runs send(headers) through the on-disk response cache when it is enabled.
+    
+    Args:
+        url (str): The URL being requested
+        send (callable): Performs the real GET given the request headers
+        headers (dict): Request headers, part of the cache key
+        
+    Returns:
+        Optional[requests.Response]: Cached, revalidated or freshly fetched response
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return send(headers)
+    return cache.fetch(url, send, headers=headers)
+
+def make_request(url: str, use_proxy: bool = False, timeout: int = 10, use_cache: bool = True) -> Optional[requests.Response]:
+    """
+    Makes an HTTP request with optional proxy support through the shared pooled client.
     
     Args:
         url (str): The URL to request
         use_proxy (bool): Whether to use proxy
         timeout (int): Request timeout in seconds
+        use_cache (bool): Whether to serve and store the page through the response cache
         
     Returns:
         Optional[requests.Response]: Response object if successful, None otherwise
     """
-    try:
-        proxies = get_proxies() if use_proxy else None
-        response = requests.get(url, proxies=proxies, timeout=timeout)
-        response.raise_for_status()
-        return response
-    except requests.exceptions.RequestException as e:
-        handle_error(f"Request failed: {str(e)}")
-        return None
+    def _send(headers):
+        if use_proxy:
+            return request_via_proxy(url, timeout=timeout, headers=headers)
+        return get_client().get(url, timeout=timeout, headers=headers)
+
+    with tracing.span('http.request', url=url, proxy=use_proxy) as span:
+        try:
+            response = cached_get(url, _send) if use_cache else _send(None)
+            if response is None:
+                span.fail("No response")
+                return None
+            if use_cache and get_response_cache() is not None:
+                span.set(cache='hit' if getattr(response, 'from_cache', False) else 'miss')
+            span.set(status=response.status_code, bytes=len(response.content))
+            response.raise_for_status()
+            return response
+        except requests.exceptions.RequestException as e:
+            span.fail(e)
+            handle_error(f"Request failed: {str(e)}")
+            return None
 
 
 def handle_error(error_message):
@@ -78,4 +174,26 @@ def extract_python_code(response_text):
     cleaned_text = re.sub(r'\*\*(.*?)\*\*', r'\1', cleaned_text)  # Remove bold
     cleaned_text = re.sub(r'\*(.*?)\*', r'\1', cleaned_text)  # Remove italic
     
-    return cleaned_text.strip()
\ No newline at end of file
+    return cleaned_text.strip()
+
+class IncrementalCodeExtractor:
+    """Finds the first complete fenced code block while a response is still streaming in."""
+    def __init__(self):
+        self.text = ""
+        self.code = None
+
+    def feed(self, chunk):
+        """Appends a streamed chunk. Returns the code once its closing fence has arrived, else None."""
+        self.text += chunk
+        if self.code is None:
+            # Same preference as extract_python_code: a ```python block, then any ``` block
+            match = (re.search(r'```python\s*(.*?)\s*```', self.text, re.DOTALL)
+                     or re.search(r'```\s*(.*?)\s*```', self.text, re.DOTALL))
+            if match:
+                self.code = match.group(1).strip()
+        return self.code
+
+    @property
+    def truncated(self):
+        """True while a code block has been opened but not closed yet."""
+        return self.text.count('```') % 2 == 1
\ No newline at end of file
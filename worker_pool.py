@@ -0,0 +1,311 @@
+import contextlib
+import importlib
+import io
+import json
+import logging
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import scraper_runtime
+from config import EXECUTOR_CONFIG
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; CPU and memory limits are skipped there
+    resource = None
+
+# Bound before any job runs, so a job that patches the json module can't garble its own result
+_dumps = json.dumps
+
+class JobResult:
+    """Outcome of running one piece of scraper code in a worker."""
+    def __init__(self, stdout='', stderr='', error=None, elapsed=0.0, timed_out=False, crashed=False):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.error = error
+        self.elapsed = elapsed
+        self.timed_out = timed_out
+        self.crashed = crashed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+class Worker:
+    """A warm Python process that runs scraper code sent to it, one job at a time."""
+    def __init__(self, config):
+        self.config = config
+        self.jobs = 0
+        self._lines = queue.Queue()
+        self.process = subprocess.Popen(
+            [sys.executable, '-u', os.path.abspath(__file__)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            env=dict(os.environ, SCRAPER_WORKER_CONFIG=json.dumps(self._worker_settings())),
+            # Own process group, so kill() also takes down a job's forked child
+            start_new_session=os.name == 'posix'
+        )
+        self.ready = False
+        threading.Thread(target=self._read_lines, daemon=True).start()
+
+    def _worker_settings(self):
+        return {key: self.config.get(key) for key in ('preload_modules', 'cpu_limit', 'memory_limit', 'fork_per_job')}
+
+    def _read_lines(self):
+        for line in self.process.stdout:
+            self._lines.put(line)
+        # EOF: the worker exited or crashed
+        self._lines.put(None)
+
+    def _wait_line(self, deadline):
+        try:
+            return self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            raise TimeoutError
+
+    def run(self, code, timeout, cwd=None, script_path=None, snapshot_dir=None):
+        """Sends one job and waits up to timeout seconds (including warm-up) for its result."""
+        start = time.monotonic()
+        deadline = start + timeout
+        try:
+            while not self.ready:
+                line = self._wait_line(deadline)
+                if line is None:
+                    return JobResult(error="Worker exited during start-up", crashed=True,
+                                     elapsed=time.monotonic() - start)
+                self.ready = line.strip() == 'ready'
+
+            self.process.stdin.write(json.dumps({
+                'code': code,
+                'cwd': cwd,
+                'script_path': script_path,
+                'snapshot_dir': snapshot_dir,
+                'cpu_limit': self.config['cpu_limit'],
+            }) + '\n')
+            self.process.stdin.flush()
+            self.jobs += 1
+            line = self._wait_line(deadline)
+        except TimeoutError:
+            self.kill()
+            return JobResult(error=f"Scraper timed out after {timeout} seconds", timed_out=True,
+                             elapsed=time.monotonic() - start)
+        except OSError as e:
+            self.kill()
+            return JobResult(error=f"Worker pipe failed: {e}", crashed=True, elapsed=time.monotonic() - start)
+
+        if line is None:
+            return JobResult(error=f"Worker crashed (exit code {self.process.wait()})", crashed=True,
+                             elapsed=time.monotonic() - start)
+        try:
+            result = json.loads(line)
+            return JobResult(result['stdout'], result['stderr'], result['error'], time.monotonic() - start)
+        except (ValueError, KeyError, TypeError):
+            # The protocol is broken, so the worker can't be trusted with another job
+            self.kill()
+            return JobResult(error=f"Worker sent an unreadable result: {line[:200]!r}", crashed=True,
+                             elapsed=time.monotonic() - start)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        if os.name == 'posix':
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except OSError:
+                # Already gone
+                pass
+        elif self.alive():
+            self.process.kill()
+        self.process.wait()
+
+    def close(self):
+        """Asks the worker to exit once it is idle."""
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.kill()
+
+class WorkerPool:
+    """Runs generated scrapers in pre-warmed worker processes.
+
+    Workers import the common scraping libraries once at start-up, so a job
+    only pays for its own code. On POSIX each job runs in a child forked from
+    the worker, so whatever it changes (environment, patched modules, socket
+    defaults) is gone with the child. Every job gets a wall-clock timeout and,
+    on POSIX, CPU-time and memory limits. A worker is replaced after
+    `max_jobs_per_worker` jobs, after a timeout or when it crashes.
+    """
+    def __init__(self, workers=None, config=None):
+        self.config = config or EXECUTOR_CONFIG
+        self.size = workers or self.config['workers']
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {'jobs': 0, 'timeouts': 0, 'crashes': 0, 'recycled': 0}
+        for _ in range(self.size):
+            self._idle.put(Worker(self.config))
+
+    def run(self, code, timeout=None, cwd=None, script_path=None, snapshot_dir=None):
+        """Runs code in an idle worker and returns its JobResult. Blocks while all workers are busy.
+
+        With snapshot_dir, scraper_runtime.get_html serves the pages saved there.
+        """
+        worker = self._idle.get()
+        try:
+            result = worker.run(code, timeout or self.config['timeout'], cwd=cwd, script_path=script_path,
+                                snapshot_dir=snapshot_dir)
+        except Exception:
+            worker.kill()
+            raise
+        finally:
+            # A worker that crashed, timed out or served its quota is replaced by a fresh one
+            with self._lock:
+                self.stats['jobs'] += 1
+                if not worker.alive() or worker.jobs >= self.config['max_jobs_per_worker']:
+                    self.stats['recycled'] += 1
+                    worker.close()
+                    worker = None if self._closed else Worker(self.config)
+                if worker is not None:
+                    self._idle.put(worker)
+        with self._lock:
+            self.stats['timeouts'] += result.timed_out
+            self.stats['crashes'] += result.crashed
+        return result
+
+    def close(self):
+        """Stops every idle worker."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_worker_pool():
+    """Returns the process-wide WorkerPool, or None when it is disabled."""
+    global _pool
+    if not EXECUTOR_CONFIG['use_worker_pool']:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = WorkerPool()
+    return _pool
+
+def _apply_limits(settings):
+    if resource is None:
+        return
+    if settings.get('memory_limit'):
+        limit = settings['memory_limit']
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+def _run_job(job):
+    """Runs one job's code as __main__ with its output captured. Returns the result dict for the parent."""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    error = None
+    previous_cwd = os.getcwd()
+    script_path = job.get('script_path') or 'scraper.py'
+    if resource is not None and job.get('cpu_limit'):
+        # RLIMIT_CPU counts the whole process, so allow this job's budget on top of what earlier jobs used
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        budget = int(used.ru_utime + used.ru_stime) + job['cpu_limit']
+        hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+        resource.setrlimit(resource.RLIMIT_CPU, (budget if hard == resource.RLIM_INFINITY else min(budget, hard), hard))
+    # Generated code usually calls logging.basicConfig, which is a no-op once handlers exist
+    root_logger = logging.getLogger()
+    for handler in root_logger.handlers[:]:
+        root_logger.removeHandler(handler)
+    scraper_runtime.use_snapshot(job.get('snapshot_dir'))
+    try:
+        if job.get('cwd'):
+            os.chdir(job['cwd'])
+        sys.argv = [script_path]
+        namespace = {'__name__': '__main__', '__file__': script_path, '__builtins__': __builtins__}
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                exec(compile(job['code'], script_path, 'exec'), namespace)
+            except SystemExit as e:
+                if e.code not in (None, 0):
+                    error = f"Scraper exited with status {e.code}"
+            except BaseException:
+                error = traceback.format_exc()
+            finally:
+                for handler in root_logger.handlers:
+                    handler.flush()
+    finally:
+        os.chdir(previous_cwd)
+    return {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'error': error}
+
+def _run_forked(job):
+    """Runs _run_job in a forked child and returns its result; the worker itself stays untouched."""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 0
+        try:
+            os.close(read_fd)
+            # Protocol lines are for the worker, not for the job
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, sys.stdin.fileno())
+            data = _dumps(_run_job(job)).encode('utf-8')
+            with os.fdopen(write_fd, 'wb') as f:
+                f.write(data)
+        except BaseException:
+            status = 1
+        finally:
+            # Skip atexit handlers and buffer flushes inherited from the worker
+            os._exit(status)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as f:
+        data = f.read()
+    _, status = os.waitpid(pid, 0)
+    try:
+        return json.loads(data.decode('utf-8'))
+    except ValueError:
+        if os.WIFSIGNALED(status):
+            reason = f"killed by signal {os.WTERMSIG(status)}"
+        else:
+            reason = f"exit code {os.waitstatus_to_exitcode(status)}"
+        return {'stdout': '', 'stderr': '', 'error': f"Scraper process died ({reason})"}
+
+def _worker_main():
+    """Worker process loop: preload libraries, then run one JSON job per stdin line."""
+    settings = json.loads(os.environ.get('SCRAPER_WORKER_CONFIG') or '{}')
+    for module in settings.get('preload_modules', []):
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    _apply_limits(settings)
+    # Job output is captured separately; keep the protocol channel to ourselves so
+    # stray writes to file descriptor 1 (e.g. from C extensions) can't corrupt it
+    channel = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    channel.write('ready\n')
+    channel.flush()
+    run = _run_forked if settings.get('fork_per_job', True) and hasattr(os, 'fork') else _run_job
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        result = run(json.loads(line))
+        channel.write(_dumps(result) + '\n')
+        channel.flush()
+
+if __name__ == "__main__":
+    _worker_main()